@@ -1,33 +1,30 @@
 import csv
-import pathlib
 import attr
-import shutil
-import unicodedata
-import hashlib
 import collections
-import openpyxl
+import functools
+import time
 import re
-from tqdm import tqdm
 
-from clldutils.path import Path, walk
-from clldutils.misc import slug
-from pycldf import Wordlist
+from clldutils.path import Path
 from pylexibank.dataset import Dataset as BaseDataset
 from pylexibank.models import Lexeme, Language
 from pylexibank.forms import FormSpec
 from pyglottolog.languoids import Glottocode
 
-from pynumerals.errorcheck import errorchecks
-from pynumerals.mappings import BASE_MAP
-
-from pynumerals.numerals_utils import (
-    split_form_table,
-    make_language_name,
-    check_for_problems,
-    make_index_link,
-    make_chan_link,
-    XLSX_LABELS,
-)
+from numerals_build.ingest import read_data_files
+from numerals_build.manifest import BuildManifest
+from numerals_build.datafiles import DataFileIndex
+from numerals_build.fetch import fetch, FETCHED
+from numerals_build.ids import LanguageIDMap, FormBuckets, natural_key
+from numerals_build.split import SplitWriter, group_rows
+from numerals_build import problems, strings
+from numerals_build.fingerprints import FingerprintIndex
+from numerals_build.xlsx import read_workbook, sheet_dicts, convert_workbooks, ConversionLog
+from numerals_build.instrument import Instrumentation
+from numerals_build.diagnostics import Diagnostics
+from numerals_build.rows import FormRow
+from numerals_build.diff import Snapshot, Tree
+from numerals_build.glottolog import GlottologIndex
 
 CHANURL = "https://lingweb.eva.mpg.de/channumerals/"
 
@@ -51,20 +48,64 @@ class CustomLexeme(Lexeme):
     Variant_ID = attr.ib(default=1)
 
     def __attrs_post_init__(self):
-        self.Problematic = False
-        for check in errorchecks:
-            if check(self.Form):
-                self.Problematic = True
-                break
-        if not self.Problematic and self.Other_Form and '<' in self.Other_Form:
-            self.Problematic = True
-
-
-def _sort_int(s):
-    try:
-        return int(s)
-    except ValueError:
-        return s
+        self.Problematic = problems.DETECTOR.is_problematic(self.Form, self.Other_Form)
+
+
+def convert_workbook(xlsx_file, form_header, lang_header, missing_data):
+    """
+    Read the data and metadata sheets of a curated xlsx workbook.
+
+    :return: pair (list of form rows - lists of values for `form_header` - for `etc/csv`, \
+    language dict for `etc/languages.csv`)
+    """
+    from pynumerals.numerals_utils import XLSX_LABELS
+
+    sheets = read_workbook(xlsx_file)
+    lang_id = XLSX_FILENAME_PATTERN.search(xlsx_file.stem).group('lang_id')
+    new_data = []
+    pcnts = collections.defaultdict(int)
+    var_id = lang_id.split('-')[-1]
+    for row in sheet_dicts(sheets[XLSX_LABELS['data']]):
+        param = row[XLSX_LABELS['param']].strip()
+        form = row[XLSX_LABELS['form']].strip()
+        if not form or form in missing_data:
+            continue
+        pcnts[param] += 1
+        id_ = '{}-{}-{}'.format(lang_id, param, pcnts[param])
+        f = CustomLexeme(
+            id_,
+            Language_ID=lang_id,
+            Parameter_ID=param,
+            Value=form,
+            Form=form,
+            Source=['chan2019'],
+            Comment=re.sub(r'[\n\r]', ' ', row[XLSX_LABELS['form_comment']]).strip()
+            if row[XLSX_LABELS['form_comment']].strip() else '',
+            Other_Form=row[XLSX_LABELS['other_form']].strip()
+            if row[XLSX_LABELS['other_form']].strip() else '',
+            Loan=bool(row[XLSX_LABELS['loan']].strip() == '1'),
+            Variant_ID=var_id,
+        )
+        new_data.append([getattr(f, h) for h in form_header])
+
+    row = {}
+    for r in sheets[XLSX_LABELS['metadata']]:
+        row[r[0].strip()] = r[1].strip()
+    lg = CustomLanguage(
+        lang_id,
+        Name=row[XLSX_LABELS['name']].strip(),
+        Glottocode=row[XLSX_LABELS['glottocode']].strip(),
+        ISO639P3code=row[XLSX_LABELS['isocode']].strip(),
+        SourceFile=row[XLSX_LABELS['sourcefile']].strip(),
+        Contributor=row[XLSX_LABELS['author']].strip(),
+        Base=row[XLSX_LABELS['base']].strip(),
+        Comment=re.sub(r'[\n\r]', ' ', row[XLSX_LABELS['lg_comment']]).strip(),
+    )
+    id_index = form_header.index('ID')
+    return (
+        sorted(new_data, key=lambda item: natural_key(item[id_index])),
+        {h: getattr(lg, h) for h in lang_header},
+    )
 
 
 class Dataset(BaseDataset):
@@ -90,68 +131,154 @@ class Dataset(BaseDataset):
         "parameters.csv",
         "sources.bib",
     ]
+    # Base URL, directory or release archive to fetch the files from, see
+    # `numerals_build.fetch`:
+    channumerals_source = URL
 
     csv_dir = "csv"
 
-    def cmd_download(self, args):
+    # language IDs with identical data tables which are known to be correct
+    datatable_check_whitelist = [
+        "mach1267-1, nant1250-1",
+        "bang1353-1, ling1263-1",
+        "lano1248-1, sabu1253-1",
+        "abai1240-1, selu1243-1",
+        "east2472-1, nort2860-1",
+        "ouma1237-1, yoba1237-1",
+        "sepa1241-1, tere1276-1",
+        "arab1268-1, iqui1243-1",
+        "sibe1248-1, uisa1238-1",
+        "xish1235-2, xxxx0049-1",
+        "leal1235-1, soch1239-1",
+        "xian1251-2, xian1251-3",
+        "yano1261-2, yano1262-2",
+        "lada1244-2, lada1244-3",
+        "pila1245-1, toba1269-2",
+        "tson1249-2, tswa1255-1",
+        "bata1290-1, bata1291-1",
+        "mont1282-1, serb1264-1",
+    ]
 
-        # Gather all overwrites from etc/csv
-        overwrites = [
-            c.stem for c in walk(self.etc_dir / self.csv_dir, mode="files") if c.suffix == ".csv"]
+    # Families exported for curation by `cldfbench numerals.subsets`, with their curators:
+    family_subsets = [
+        ("Dravidian", "Mamta"),
+        ("Sino-Tibetan", "Mamta"),
+        ("Austroasiatic", "Mamta"),
+        ("Atlantic-Congo", "Enock"),
+    ]
 
-        index = Path(self.raw_dir / "index.md")
+    @property
+    def build_dir(self):
+        """
+        Directory for build artefacts which are not part of the dataset (caches, reports).
+        """
+        return self.dir / ".build"
 
-        # Create index always from scratch:
-        if index.exists():
-            Path.unlink(index)
+    def data_files(self):
+        """
+        Index of the data files in `etc/csv` and `raw/csv`, see `numerals_build.datafiles`.
+        """
+        return DataFileIndex(self.etc_dir / self.csv_dir, self.raw_dir / self.csv_dir)
 
-        for f in self.channumerals_files:
-            self.raw_dir.download("{0}/{1}".format(URL, f), f, log=args.log)
+    @property
+    def glottolog_index_path(self):
+        """
+        Local index of the Glottolog metadata, see `numerals_build.glottolog`.
+        """
+        return self.etc_dir / "glottolog.sqlite"
+
+    # Set for the duration of a build command, see `_cmd_download` and `_cmd_makecldf`:
+    instrumentation = None
+
+    def _instrumented(self, args, cmd, run):
+        self.instrumentation = Instrumentation(profile=getattr(args, 'profile', None))
+        report = self.build_dir / '{0}-report.json'.format(cmd)
+        try:
+            with self.instrumentation.run(report):
+                run(args)
+        finally:
+            self.instrumentation = None
+        args.log.info('build report written to {0}'.format(report))
+
+    def _cmd_download(self, args):
+        self._instrumented(args, 'download', super()._cmd_download)
+
+    def _cmd_makecldf(self, args):
+        def run(args):
+            super(Dataset, self)._cmd_makecldf(args)
+            # Store the per-language digests of the build, see `numerals_build.diff`:
+            with self.instrumentation.stage('digests'):
+                Snapshot.from_tree(Tree(self.dir), cache_dir=self.build_dir / 'digests')
+
+        self._instrumented(args, 'makecldf', run)
+
+    def cmd_download(self, args):
+        # Only needed to download, so not imported with the dataset:
+        from pycldf import Wordlist
+        from pynumerals.numerals_utils import (
+            split_form_table,
+            make_language_name,
+            check_for_problems,
+            make_index_link,
+            make_chan_link,
+        )
+
+        instr = self.instrumentation or Instrumentation()
+
+        # Gather all overwrites from etc/csv
+        overwrites = set(self.data_files().overwrites)
+
+        with instr.stage('download', items=len(self.channumerals_files)):
+            fetched = fetch(
+                getattr(args, 'source', None) or self.channumerals_source,
+                self.channumerals_files,
+                self.raw_dir,
+                self.build_dir / 'download-state.json',
+                workers=getattr(args, 'fetch_workers', 4),
+                log=args.log)
+            instr.count('fetched_files', list(fetched.values()).count(FETCHED))
 
         channumerals = Wordlist.from_metadata("raw/cldf-metadata.json")
-        split_ft = split_form_table(channumerals)
-        language_table = list(channumerals["LanguageTable"])
+        if getattr(args, 'streaming', False):
+            # Read forms.csv row by row, writing each language's file as soon as it is complete:
+            split_ft = group_rows(channumerals["FormTable"])
+        else:
+            split_ft = split_form_table(channumerals)
+        language_table = {lt["ID"]: lt for lt in channumerals["LanguageTable"]}
 
         """
         This splits the list of forms into individual files, grouped by families (or Other for
         smaller families).
         """
-        for entry in split_ft:
-            lt = next(
-                item for item in language_table if item["ID"] == entry[0]["Language_ID"])
-
-            if lt["Glottocode"]:
-                lid = lt["Glottocode"]
-            else:
-                lid = lt["ID"]
-
-            chansrc = lt["SourceFile"]
-            problems = check_for_problems(entry)
-            csv_name = Path(lt["ID"] + ".csv")
-
-            # check for overwrites
-            if lt["ID"] in overwrites:
-                problems += " - [has overwrite](../{0})".format(
-                    str(self.etc_dir / self.csv_dir / csv_name))
-
-            pathlib.Path(self.raw_dir / self.csv_dir).mkdir(
-                parents=True, exist_ok=True)
-
-            # Write data from form table into respective CSV file:
-            with open(self.raw_dir / self.csv_dir / csv_name, "w") as outfile:
-                fp = csv.DictWriter(outfile, entry[0].keys())
-                fp.writeheader()
-                fp.writerows(
-                    sorted(entry, key=lambda x: int(x["Parameter_ID"])))
-                github_file = outfile.name
-
-            # Write index for easier reference:
-            with open(index, "a+") as outfile:
-                index_link = make_index_link(github_file)
-                chan_link = make_chan_link(chansrc, CHANURL)
-                language_name = make_language_name(lt["Name"])
-                outfile.write(index_link + chan_link +
-                              language_name + problems + "\n")
+        with SplitWriter(self.raw_dir / self.csv_dir, self.raw_dir / "index.md") as writer:
+            for entry in instr.iterate('row_parsing', split_ft):
+                start = time.perf_counter()
+                lt = language_table[entry[0]["Language_ID"]]
+
+                chansrc = lt["SourceFile"]
+                with instr.stage('validation', items=len(entry)):
+                    problems = check_for_problems(entry)
+                csv_name = lt["ID"] + ".csv"
+
+                # check for overwrites
+                if lt["ID"] in overwrites:
+                    problems += " - [has overwrite](../{0})".format(
+                        str(self.etc_dir / self.csv_dir / csv_name))
+
+                with instr.stage('sorting', items=len(entry)):
+                    rows = sorted(entry, key=lambda x: int(x["Parameter_ID"]))
+
+                with instr.stage('writing', items=len(entry)):
+                    # Write data from form table into respective CSV file:
+                    github_file = writer.write_csv(csv_name, entry[0].keys(), rows)
+
+                    # Write index for easier reference:
+                    writer.add_index_line(
+                        make_index_link(str(github_file)) +
+                        make_chan_link(chansrc, CHANURL) +
+                        make_language_name(lt["Name"]) +
+                        problems)
+                instr.language(lt["ID"], time.perf_counter() - start, len(entry))
 
         # read edited xlsx files
         etc_languages = {}
@@ -160,93 +287,74 @@ class Dataset(BaseDataset):
                 etc_languages[row['ID']] = row
         form_header = [c.name for c in channumerals["FormTable"].tableSchema.columns]
         lang_header = [c.name for c in channumerals["LanguageTable"].tableSchema.columns]
-        edited_path = self.raw_dir / 'xlsx'
-        data_sheet_name = XLSX_LABELS['data']
-        metadata_sheet_name = XLSX_LABELS['metadata']
 
-        for xlsx_file in edited_path.glob('numerals-*.xlsx'):
-            p = edited_path.xlsx2csv(xlsx_file)
-            pdata = p[data_sheet_name]
+        conversions = ConversionLog(self.build_dir / 'xlsx-hashes.json')
+        xlsx_files = []
+        for xlsx_file in sorted((self.raw_dir / 'xlsx').glob('numerals-*.xlsx')):
             try:
-                lang_id = XLSX_FILENAME_PATTERN.search(p[data_sheet_name].stem).group('lang_id')
+                lang_id = XLSX_FILENAME_PATTERN.search(xlsx_file.stem).group('lang_id')
             except AttributeError:
                 args.log.error('Check XLSX file name {}'.format(xlsx_file))
                 raise
-            new_data_path = self.etc_dir / self.csv_dir / '{}.csv'.format(lang_id)
-            new_data = []
-            pcnts = collections.defaultdict(int)
-            var_id = new_data_path.stem.split('-')[-1]
-            with open(pdata) as cf:
-                reader = csv.DictReader(cf)
-                for row in reader:
-                    param = row[XLSX_LABELS['param']].strip()
-                    form = row[XLSX_LABELS['form']].strip()
-                    if not form or form in self.form_spec.missing_data:
-                        continue
-                    pcnts[param] += 1
-                    id_ = '{}-{}-{}'.format(new_data_path.stem, param, pcnts[param])
-                    f = CustomLexeme(
-                        id_,
-                        Language_ID=new_data_path.stem,
-                        Parameter_ID=param,
-                        Value=form,
-                        Form=form,
-                        Source=['chan2019'],
-                        Comment=re.sub(r'[\n\r]', ' ', row[XLSX_LABELS['form_comment']]).strip()
-                        if row[XLSX_LABELS['form_comment']].strip() else '',
-                        Other_Form=row[XLSX_LABELS['other_form']].strip()
-                        if row[XLSX_LABELS['other_form']].strip() else '',
-                        Loan=bool(row[XLSX_LABELS['loan']].strip() == '1'),
-                        Variant_ID=var_id,
-                    )
-                    new_data.append({h: getattr(f, h) for h in form_header})
+            if lang_id in etc_languages and conversions.is_current(
+                    xlsx_file,
+                    self.etc_dir / self.csv_dir / '{}.csv'.format(lang_id),
+                    etc_languages[lang_id]):
+                continue
+            xlsx_files.append(xlsx_file)
+        args.log.info('converting {0} changed xlsx files'.format(len(xlsx_files)))
+
+        converter = functools.partial(
+            convert_workbook,
+            form_header=form_header,
+            lang_header=lang_header,
+            missing_data=self.form_spec.missing_data)
+        for xlsx_file, (new_data, language) in zip(
+                xlsx_files,
+                instr.iterate(
+                    'xlsx_conversion',
+                    convert_workbooks(converter, xlsx_files, workers=getattr(args, 'workers', 1)))):
+            if language['Glottocode'] != language['ID'].split('-')[0]:
+                args.log.error('{} - mismatch file name and glottocode'.format(xlsx_file))
 
             # write data to etc/csv
-            with open(new_data_path, 'w') as of:
-                fp = csv.DictWriter(of, new_data[0].keys())
-                fp.writeheader()
-                fp.writerows(
-                    sorted(new_data, key=lambda item: ([_sort_int(i) for i in item['ID'].split('-')])))
-            pdata.unlink()
+            new_data_path = self.etc_dir / self.csv_dir / '{}.csv'.format(language['ID'])
+            with instr.stage('writing', items=len(new_data)):
+                with open(new_data_path, 'w') as of:
+                    fp = csv.writer(of)
+                    fp.writerow(form_header)
+                    fp.writerows(new_data)
+            conversions.add(xlsx_file, new_data_path, language)
 
             # gather xlsx metadata for etc/languages.csv
-            with open(p[metadata_sheet_name]) as cf:
-                reader = csv.reader(cf)
-                row = {}
-                for r in reader:
-                    row[r[0].strip()] = r[1].strip()
-                if row['GLOTTOCODE:'] != new_data_path.stem.split('-')[0]:
-                    args.log.error('{} - mismatch file name and glottocode'.format(xlsx_file))
-                lg = CustomLanguage(
-                    new_data_path.stem,
-                    Name=row[XLSX_LABELS['name']].strip(),
-                    Glottocode=row[XLSX_LABELS['glottocode']].strip(),
-                    ISO639P3code=row[XLSX_LABELS['isocode']].strip(),
-                    SourceFile=row[XLSX_LABELS['sourcefile']].strip(),
-                    Contributor=row[XLSX_LABELS['author']].strip(),
-                    Base=row[XLSX_LABELS['base']].strip(),
-                    Comment=re.sub(r'[\n\r]', ' ', row[XLSX_LABELS['lg_comment']]).strip(),
-                )
-                etc_languages[new_data_path.stem] = {h: getattr(lg, h) for h in lang_header}
-
-            p[metadata_sheet_name].unlink()
+            etc_languages[language['ID']] = language
 
         new_etc_languages = sorted(etc_languages.values(),
-                                   key=lambda item: ([_sort_int(i) for i in item['ID'].split('-')]))
-        with open(self.etc_dir / 'languages.csv', 'w') as of:
-            fp = csv.DictWriter(of, new_etc_languages[0].keys())
-            fp.writeheader()
-            fp.writerows(new_etc_languages)
+                                   key=lambda item: natural_key(item['ID']))
+        with instr.stage('writing', items=len(new_etc_languages)):
+            with open(self.etc_dir / 'languages.csv', 'w') as of:
+                fp = csv.DictWriter(of, new_etc_languages[0].keys())
+                fp.writeheader()
+                fp.writerows(new_etc_languages)
+        conversions.write()
 
     def cmd_makecldf(self, args):
+        from tqdm import tqdm
+        from pynumerals.mappings import BASE_MAP
+        from numerals_build.coverage import CoverageMatrix
+
+        instr = self.instrumentation or Instrumentation()
+        # The CLDF data is written when the writer context is left, after this method returns:
+        args.writer.write = instr.timed('writing', args.writer.write)
 
         args.writer.add_sources()
+        if isinstance(self.glottolog, GlottologIndex):
+            # The writer only records cldfbench catalogs as provenance:
+            args.writer.cldf.add_provenance(wasDerivedFrom=[self.glottolog.json_ld()])
 
         valid_parameters = set()
         valid_languages = set()
-        changed_glottolog_codes = []
-        no_glottolog_codes = []
-        no_data_paths = []
+        diagnostics = Diagnostics()
 
         args.writer.add_concepts(id_factory=lambda d: d.english)
 
@@ -254,7 +362,8 @@ class Dataset(BaseDataset):
             valid_parameters.add(concept["Name"])
 
         edited_lang_ids = set()  # coming from xlsx files
-        for xlsx_file in (self.raw_dir / 'xlsx').glob('numerals-*.xlsx'):
+        xlsx_files = sorted((self.raw_dir / 'xlsx').glob('numerals-*.xlsx'))
+        for xlsx_file in xlsx_files:
             try:
                 edited_lang_ids.add(XLSX_FILENAME_PATTERN.search(xlsx_file.stem).group('lang_id'))
             except AttributeError:
@@ -293,79 +402,83 @@ class Dataset(BaseDataset):
 
         language_data_paths = []
         overwrites_cnt = 0
+        # Stages are measured one after the other, so their times add up to the wall time:
+        with instr.stage('file_resolution', items=len(self.languages)):
+            data_files = self.data_files()
+            lang_ids, with_data = [], set()
+            for language in self.languages:
+                language['ID'] = language['ID'].strip()
+                lang_ids.append(language['ID'])
+                if language['ID'] in ignored_lang_ids:
+                    continue
+
+                # Gather correct data path
+                data_file = data_files.resolve(language['ID'])
+                if data_file is None:
+                    diagnostics.add('no_data', language=language['ID'])
+                    continue
+                language_data_paths.append(data_file.path)
+                with_data.add(language['ID'])
+                if data_file.overwrite:
+                    overwrites_cnt += 1
+
+            for data_file in data_files.orphans(lang_ids)[0]:
+                diagnostics.add(
+                    'orphan_data_file', file=data_file.path.relative_to(self.dir).as_posix())
+
+        with instr.stage('language_mapping', items=len(self.languages)):
+            # lang_id follows glottocode and renumbering *-1, *-2, ...
+            lgid_map = LanguageIDMap.from_languages(self.languages, ignored=ignored_lang_ids)
+
+            for language in self.languages:
+                # Skip ignored languages and languages without data file:
+                if language['ID'] not in with_data:
+                    continue
+
+                if language["Base"]:
+                    if language["Base"] in BASE_MAP:
+                        language["Base"] = BASE_MAP[language["Base"]]
+                    else:
+                        diagnostics.add(
+                            'unknown_base',
+                            log=args.log,
+                            language=language['ID'],
+                            value=language["Base"])
+
+                if language['Glottocode']:
+                    if language['ID'].split("-")[0] != language['Glottocode']:
+                        diagnostics.add(
+                            'changed_glottocode',
+                            language=language['ID'],
+                            value=language['Glottocode'])
+                    if self.glottolog is not None \
+                            and language['Glottocode'] not in self.glottolog.cached_languoids:
+                        diagnostics.add(
+                            'unknown_glottocode',
+                            language=language['ID'],
+                            value=language['Glottocode'])
+                    del language["Glottolog_Name"]
+                    # Remove empty attrs which can be provided by Glottolog
+                    # for filling them while adding
+                    if not language["Latitude"]:
+                        del language["Latitude"]
+                        del language["Longitude"]
+                    if not language["Macroarea"]:
+                        del language["Macroarea"]
+                    if not language["Family"]:
+                        del language["Family"]
+                else:
+                    diagnostics.add('no_glottocode', language=language['ID'])
 
-        # lang_id follows glottocode and renumbering *-1, *-2, ...
-        lgid_map = collections.defaultdict(list)
-        lgid_map_gc = {}
-        for language in self.languages:
-            language['ID'] = language['ID'].strip()
-            if language['ID'] in ignored_lang_ids:
-                continue
-            if language['Glottocode']:
-                lgid_map[language['Glottocode']].append(language['ID'])
-                lgid_map_gc[language['ID']] = language['Glottocode']
-            else:
-                c_ = language['ID'].split('-')[0]
-                lgid_map[c_].append(language['ID'])
-                lgid_map_gc[language['ID']] = c_
-
-        for language in self.languages:
-
-            language['ID'] = language['ID'].strip()
-            if language['ID'] in ignored_lang_ids:
-                continue
-
-            # Gather correct data path
-            if (self.etc_dir / self.csv_dir / (language['ID'] + ".csv")).exists():
-                language_data_paths.append(self.etc_dir / self.csv_dir / (language['ID'] + ".csv"))
-                overwrites_cnt += 1
-            elif (self.raw_dir / self.csv_dir / (language['ID'] + ".csv")).exists():
-                language_data_paths.append(self.raw_dir / self.csv_dir / (language['ID'] + ".csv"))
-            else:
-                no_data_paths.append(language['ID'])
-                continue
+                valid_languages.add(language['ID'])
 
-            if language["Base"]:
-                if language["Base"] in BASE_MAP:
-                    language["Base"] = BASE_MAP[language["Base"]]
-                else:
-                    args.log.warn("Base '{0}' is unknown for {1}".format(
-                        language["Base"], language['ID']))
+                language['ID'] = lgid_map.renumber(language['ID'])
 
-            if language['Glottocode']:
-                if language['ID'].split("-")[0] != language['Glottocode']:
-                    changed_glottolog_codes.append(
-                        (language['ID'], language['Glottocode'])
-                    )
-                del language["Glottolog_Name"]
-                # Remove empty attrs which can be provided by Glottolog
-                # for filling them while adding
-                if not language["Latitude"]:
-                    del language["Latitude"]
-                    del language["Longitude"]
-                if not language["Macroarea"]:
-                    del language["Macroarea"]
-                if not language["Family"]:
-                    del language["Family"]
-            else:
-                no_glottolog_codes.append(language['ID'])
-
-            valid_languages.add(language['ID'])
-
-            ngc_ = lgid_map_gc[language['ID']]
-            language['ID'] = '{}-{}'.format(ngc_, lgid_map[ngc_].index(language['ID']) + 1)
-
-            args.writer.add_language(**language)
+                args.writer.add_language(**language)
 
         args.writer.cldf['FormTable', 'Problematic'].datatype.base = 'boolean'
 
-        unknown_params = []
-        misaligned_overwrites = set()
-        misaligned = set()
-        unknown_languages = []
         seen_unknown_languages = set()
-        form_length = set()
-        other_form = set()
 
         # form IDs and forms which are correct after error checking
         whitelist = {
@@ -392,175 +505,166 @@ class Dataset(BaseDataset):
             "torr1259-1-19-1": "əndal wombuk wombuk are wombuk wiyeu wiyeu",
             "torr1259-1-20-1": "əndal wombuk wombuk are wombuk wombuk",
         }
-        whitelist_datatable_check = [
-            "mach1267-1, nant1250-1",
-            "bang1353-1, ling1263-1",
-            "lano1248-1, sabu1253-1",
-            "abai1240-1, selu1243-1",
-            "east2472-1, nort2860-1",
-            "ouma1237-1, yoba1237-1",
-            "sepa1241-1, tere1276-1",
-            "arab1268-1, iqui1243-1",
-            "sibe1248-1, uisa1238-1",
-            "xish1235-2, xxxx0049-1",
-            "leal1235-1, soch1239-1",
-            "xian1251-2, xian1251-3",
-            "yano1261-2, yano1262-2",
-            "lada1244-2, lada1244-3",
-            "pila1245-1, toba1269-2",
-            "tson1249-2, tswa1255-1",
-            "bata1290-1, bata1291-1",
-            "mont1282-1, serb1264-1",
-        ]
-
-        datatable_checks = {}
-        datatable_checks_slug = {}
+
+        # Forms are moved out of the writer as compact rows after each data file. With
+        # --streaming, they are spilled to disk, to be read back language by language when the
+        # FormTable is written.
+        streaming = getattr(args, 'streaming', False)
+        forms = FormBuckets(spill_dir=self.build_dir if streaming else None)
+        fingerprints = FingerprintIndex()
+        fingerprints.reuse(self.build_dir / 'fingerprints.json')
+        coverage = CoverageMatrix(
+            sorted((lg['ID'] for lg in args.writer.objects['LanguageTable']), key=natural_key),
+            [p['ID'] for p in args.writer.objects['ParameterTable']])
+
+        manifest = None
+        if getattr(args, 'reuse_parsed', False):
+            # Only parsing and validation of unchanged data files is skipped; changed inputs
+            # are reported:
+            manifest = BuildManifest(self.build_dir / 'manifest', index=data_files)
+            for p in manifest.changed_inputs([self.etc_dir / 'languages.csv'] + xlsx_files):
+                args.log.info('changed input {0}'.format(p))
 
         # Gather all csv data files
-        for c in tqdm(language_data_paths, desc="Processing data files"):
-            with Path.open(c) as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-
-                    lang_id = row["Language_ID"].strip()
-
-                    if lang_id in ignored_lang_ids:
-                        continue
-                    if lang_id not in valid_languages:
-                        if lang_id not in seen_unknown_languages:
-                            unknown_languages.append({'id': lang_id, 'lg': c.name})
-                            seen_unknown_languages.add(lang_id)
-                        continue
-
-                    param_id = row["Parameter_ID"].strip()
-                    if param_id not in valid_parameters:
-                        unknown_params.append(
-                            'Parameter_ID {0} for {1} unknown'.format(param_id, lang_id))
-                        continue
-
-                    form = unicodedata.normalize('NFC', row["Form"].strip())
-
-                    if form in self.form_spec.missing_data:
-                        continue
-
-                    if len(row) != 14:
-                        misaligned.add(c)
-
-                    if row["Loan"] is None or\
-                            row["Variant_ID"] is None or\
-                            len(row["Loan"].strip()) < 3 or\
-                            len(row["Variant_ID"].strip()) < 1:
-                        misaligned_overwrites.add(lang_id)
-
-                    value = unicodedata.normalize('NFC', row["Value"].strip())
-
-                    if len(form) > len(value) + 1 or\
-                            "[" in form or "]" in form:
-                        form_length.add(c.name)
-
-                    if row["Other_Form"] is not None and\
-                            ("[" in row["Other_Form"] or "]" in row["Other_Form"]):
-                        other_form.add(c.name)
-
-                    ngc = lgid_map_gc[lang_id]
-                    nlang_id = '{}-{}'.format(ngc, lgid_map[ngc].index(lang_id) + 1)
-                    args.writer.add_form(
+        results = (manifest.read_data_files if manifest else read_data_files)(
+            language_data_paths,
+            workers=getattr(args, 'workers', 1),
+            ignored_lang_ids=ignored_lang_ids,
+            valid_languages=valid_languages,
+            valid_parameters=valid_parameters,
+            missing_data=self.form_spec.missing_data,
+        )
+        start = time.perf_counter()
+        for res in tqdm(
+                instr.iterate('row_parsing', results),
+                total=len(language_data_paths),
+                desc="Processing data files"):
+            path = res.path.relative_to(self.dir).as_posix()
+            overwrite = res.path.parent == self.etc_dir / self.csv_dir
+            for lang_id in res.unknown_languages:
+                if lang_id not in seen_unknown_languages:
+                    diagnostics.add('unknown_language', language=lang_id, file=path)
+                    seen_unknown_languages.add(lang_id)
+            for param_id, lang_id, line in res.unknown_params:
+                diagnostics.add(
+                    'unknown_parameter', language=lang_id, parameter=param_id, file=path, row=line)
+            for line in res.misaligned:
+                diagnostics.add('misaligned_columns', file=path, row=line)
+            for lang_id in sorted(res.misaligned_overwrites):
+                diagnostics.add('misaligned_overwrite', language=lang_id, file=path)
+            for line in res.form_length:
+                diagnostics.add('form_length', file=path, row=line)
+            for line in res.other_form:
+                diagnostics.add('other_form_brackets', file=path, row=line)
+
+            with instr.stage('adding_forms', items=len(res.rows)):
+                for lang_id, param_id, value, form, comment, oform, loan, var_id, problem \
+                        in res.rows:
+                    nlang_id = lgid_map.renumber(lang_id)
+                    lexeme = args.writer.add_form(
                         Value=value,
                         Form=form,
                         Language_ID=nlang_id,
                         Parameter_ID=param_id,
                         Source="chan2019",
-                        Comment=row["Comment"].strip() if row["Comment"].strip() else "",
-                        Other_Form=row["Other_Form"].strip() if row["Other_Form"].strip() else "",
-                        Loan=bool(row["Loan"].strip() == "True"),
-                        Variant_ID=row["Variant_ID"].strip() if row["Variant_ID"].strip() else "",
-                        Problematic=bool(row["Problematic"].strip() == "True"),
+                        Comment=comment,
+                        Other_Form=oform,
+                        Loan=loan,
+                        Variant_ID=var_id,
+                        Problematic=problem,
                     )
-                    if lang_id not in datatable_checks:
-                        datatable_checks[lang_id] = []
-                    datatable_checks[lang_id].append(form)
-                    if lang_id not in datatable_checks_slug:
-                        datatable_checks_slug[lang_id] = []
-                    datatable_checks_slug[lang_id].append(slug(form))
-
-        # check identical data tables
-        for f in datatable_checks:
-            datatable_checks[f] = hashlib.md5(
-                "".join(datatable_checks[f]).encode("utf-8")).hexdigest()
-        datatable_checks_flipped = {}
-        for key, value in datatable_checks.items():
-            if value not in datatable_checks_flipped:
-                datatable_checks_flipped[value] = [key]
-            else:
-                datatable_checks_flipped[value].append(key)
-        for k, v in datatable_checks_flipped.items():
-            if len(v) > 1:
-                vj = ", ".join(sorted(v))
-                if vj not in whitelist_datatable_check:
-                    args.log.warn("Check identical data tables in lang_ids: {0}".format(vj))
-
-        # check identical data tables by using slug
-        for f in datatable_checks_slug:
-            datatable_checks_slug[f] = hashlib.md5(
-                "".join(datatable_checks_slug[f]).encode("utf-8")).hexdigest()
-        datatable_checks_slug_flipped = {}
-        for key, value in datatable_checks_slug.items():
-            if value not in datatable_checks_slug_flipped:
-                datatable_checks_slug_flipped[value] = [key]
-            else:
-                datatable_checks_slug_flipped[value].append(key)
-        for k, v in datatable_checks_slug_flipped.items():
-            if len(v) > 1:
-                vj = ", ".join(sorted(v))
-                if vj not in whitelist_datatable_check:
-                    args.log.warn("Check identical data tables in lang_ids (slug): {0}".format(vj))
-
-        # apply the same sort order as for channumerals
-        args.writer.objects['FormTable'] = sorted(
-            args.writer.objects['FormTable'],
-            key=lambda item: ([_sort_int(i) for i in item['ID'].split('-')])
-        )
-        # sort LanguageTable
-        args.writer.objects['LanguageTable'] = sorted(
-            args.writer.objects['LanguageTable'],
-            key=lambda item: ([_sort_int(i) for i in item['ID'].split('-')])
-        )
+                    if lexeme:
+                        lexeme = FormRow.from_dict(lexeme)
+                        if lexeme.Problematic:
+                            if whitelist.get(lexeme.ID) == lexeme.Form:
+                                lexeme.Problematic = False
+                            else:
+                                diagnostics.add(
+                                    'problematic_form',
+                                    language=lang_id,
+                                    parameter=param_id,
+                                    file=path,
+                                    form_id=lexeme.ID,
+                                    value=lexeme.Form)
+                        forms.add(lexeme)
+                        coverage.add(
+                            lexeme.Language_ID,
+                            lexeme.Parameter_ID,
+                            loan=lexeme.Loan,
+                            problematic=lexeme.Problematic,
+                            overwrite=overwrite)
+                # The writer's dicts are replaced by the compact rows kept in `forms`:
+                args.writer.objects['FormTable'].clear()
+
+            with instr.stage('duplicate_detection', items=len(res.rows)):
+                for row in res.rows:
+                    fingerprints.add_form(row[0], row[1], row[3])
+
+            if streaming:
+                with instr.stage('sorting'):
+                    forms.flush()
+
+            # The cost of a data file includes reading it, unless read by worker processes:
+            now = time.perf_counter()
+            instr.language(res.path.stem, now - start, len(res.rows))
+            start = now
+
+        instr.count('data_files', len(language_data_paths))
+        instr.count('overwrites', overwrites_cnt)
+        instr.count('forms', len(forms))
+        if manifest:
+            manifest.save()
+            instr.count('cached_data_files', manifest.stats['cached'])
+            args.log.info('{0} data files re-used from cache, {1} parsed'.format(
+                manifest.stats['cached'], manifest.stats['parsed']))
+
+        with instr.stage('duplicate_detection'):
+            # check identical data tables
+            fingerprints.save(self.build_dir / 'fingerprints.json')
+            for v in fingerprints.duplicates('raw'):
+                vj = ", ".join(v)
+                if vj not in self.datatable_check_whitelist:
+                    diagnostics.add('identical_tables', log=args.log, value=vj)
+
+            # check identical data tables by using slug
+            for v in fingerprints.duplicates('slug'):
+                vj = ", ".join(v)
+                if vj not in self.datatable_check_whitelist:
+                    diagnostics.add('identical_tables_slug', log=args.log, value=vj)
+
+        with instr.stage('sorting', items=len(forms)):
+            # apply the same sort order as for channumerals
+            args.writer.objects['FormTable'] = forms if streaming else list(forms)
+            # sort LanguageTable
+            args.writer.objects['LanguageTable'] = sorted(
+                args.writer.objects['LanguageTable'],
+                key=lambda item: natural_key(item['ID'])
+            )
+
+        # The mapping is a build by-product, not part of the CLDF dataset:
+        self.build_dir.mkdir(exist_ok=True)
+        lgid_map.write(self.build_dir / 'language-ids.csv')
+
+        with instr.stage('coverage'):
+            path = self.build_dir / 'coverage.npz'
+            if path.exists():
+                path.replace(self.build_dir / 'coverage-previous.npz')
+            coverage.save(path)
 
         args.log.info('{0} overwritten languages'.format(overwrites_cnt))
 
-        for u in changed_glottolog_codes:
-            args.log.info("changed {0} to {1}".format(u[0], u[1]))
-
-        for u in ignored_lang_ids:
-            args.log.info("removed ID {0}".format(u))
-
-        for u in no_glottolog_codes:
-            args.log.info("no Glottolog code for ID {0}".format(u))
-
-        for u in args.writer.objects['FormTable']:
-            if u["Problematic"]:
-                if u["ID"] in whitelist and u["Form"] == whitelist[u["ID"]]:
-                    u["Problematic"] = False
-                else:
-                    args.log.warn("{0} -> {1}".format(u["ID"], u["Form"]))
-
-        for u in sorted(unknown_params, key=lambda k: int(k.split(" ")[1])):
-            args.log.warn(u)
-
-        for u in sorted(misaligned_overwrites):
-            args.log.warn("check overwrite {0} for misalignments".format(u))
-
-        for u in sorted(misaligned):
-            args.log.warn("check {0} for number of colums".format(u))
-
-        for u in sorted(unknown_languages, key=lambda k: k['lg']):
-            args.log.warn("check Language_ID {0} in overwrite {1}".format(u['id'], u['lg']))
-
-        for u in sorted(form_length):
-            args.log.warn("check Form in {0}".format(u))
-
-        for u in sorted(other_form):
-            args.log.warn("check Other_Form for [] in {0}".format(u))
-
-        for u in sorted(no_data_paths):
-            args.log.warn("no data for {0}".format(u))
+        for name, stats in strings.statistics().items():
+            instr.count('{0}_cache_hits'.format(name), stats['hits'])
+            instr.count('{0}_cache_misses'.format(name), stats['misses'])
+            args.log.info('{0} cache: {1} strings, hit rate {2:.1%}'.format(
+                name, stats['size'], stats['hit_rate']))
+
+        # Sorted, so the log doesn't depend on the iteration order of the set:
+        for u in sorted(ignored_lang_ids, key=natural_key):
+            diagnostics.add('ignored_language', language=u)
+
+        diagnostics.log(args.log)
+        for code, n in diagnostics.counts().items():
+            instr.count(code, n)
+        diagnostics.write_csv(self.build_dir / 'diagnostics.csv')
+        diagnostics.write_json(self.build_dir / 'diagnostics.json')
@@ -0,0 +1,3 @@
+"""
+Support code for the build pipeline of the numerals dataset (see `lexibank_numerals.py`).
+"""
@@ -0,0 +1,375 @@
+"""
+Benchmarks for the stages of the build pipeline, run on synthetic data shaped like the
+channumerals data - 5,352 varieties with about 35 forms each, and 141 curated workbooks, at
+scale 1.
+
+Each stage is timed (wall and CPU time) and, optionally, memory-profiled with `tracemalloc`.
+Results are JSON-serializable, so reports of different commits can be compared with `compare`.
+
+`import_time` measures the cost of importing the dataset module itself, which is paid whenever
+datasets are enumerated via the `lexibank.dataset` entry point.
+"""
+import csv
+import sys
+import json
+import time
+import functools
+import random
+import pathlib
+import platform
+import tracemalloc
+import subprocess
+import collections
+
+import attr
+
+from numerals_build.ids import LanguageIDMap, FormBuckets
+from numerals_build.ingest import read_data_files, FORM_COLUMNS
+from numerals_build.fingerprints import FingerprintIndex
+from numerals_build.split import SplitWriter
+from numerals_build.xlsx import convert_workbooks
+from numerals_build.rows import FormRow
+
+VARIETIES = 5352
+WORKBOOKS = 141
+FORMS_PER_VARIETY = 35
+PARAMETERS = \
+    [str(i) for i in range(1, 101)] + \
+    [str(i * 100) for i in range(2, 11)] + \
+    [str(i * 1000) for i in range(2, 11)] + \
+    [str(10 ** i) for i in range(5, 20)]
+HEADER = [
+    'ID', 'Local_ID', 'Language_ID', 'Parameter_ID', 'Value', 'Form', 'Segments', 'Comment',
+    'Source', 'Cognacy', 'Loan', 'Problematic', 'Other_Form', 'Variant_ID']
+assert len(HEADER) == FORM_COLUMNS
+
+_SEGMENTS = ['a', 'e', 'i', 'o', 'u', 'ə', 'ɛ', 'ɔ', 'k', 't', 'p', 'm', 'n', 'ŋ', 's', 'ʃ', 'l',
+             'r', 'w', 'j', 'ʔ', 'ɓ', 'ã', 'ĩ', 'ː', 'ʰ', 'á', 'ò']
+
+
+class Dataset:
+    """
+    A synthetic dataset in `directory`, with data files in `csv/`, `languages.csv` and curated
+    workbooks for the first varieties in `xlsx/`.
+    """
+    def __init__(self, directory, scale=1.0, seed=2019):
+        self.dir = pathlib.Path(directory)
+        self.scale = scale
+        self.rnd = random.Random(seed)
+        self.languages = []
+        self.paths = []
+        self.xlsx_paths = []
+        self.forms = 0
+
+    def _word(self):
+        return ''.join(self.rnd.choice(_SEGMENTS) for _ in range(self.rnd.randint(2, 8)))
+
+    def _table(self):
+        n = min(len(PARAMETERS), max(1, int(self.rnd.gauss(FORMS_PER_VARIETY, 8))))
+        params = sorted(self.rnd.sample(PARAMETERS, n), key=int)
+        res = []
+        for param in params:
+            form = self._word()
+            r = self.rnd.random()
+            if r < 0.01:
+                form += ' <Eng.'
+            elif r < 0.02:
+                form = '({0}'.format(form)
+            elif r < 0.05:
+                form = '{0} {1}'.format(form, self._word())
+            res.append((param, form))
+        return res
+
+    def generate(self):
+        csv_dir = self.dir / 'csv'
+        csv_dir.mkdir(parents=True, exist_ok=True)
+        n, gc, tables = int(round(VARIETIES * self.scale)), 0, []
+        while len(self.languages) < n:
+            gc += 1
+            glottocode = '{0}{1:04d}'.format(
+                ''.join(chr(97 + (gc // 26 ** i) % 26) for i in range(4)), gc % 10000)
+            varieties = min(self.rnd.choice([1, 1, 1, 2, 3]), n - len(self.languages))
+            for variety in range(1, varieties + 1):
+                lang_id = '{0}-{1}'.format(glottocode, variety)
+                self.languages.append(dict(ID=lang_id, Glottocode=glottocode, Name=lang_id))
+                # Copied varieties, as found in the real data:
+                table = self.rnd.choice(tables) if tables and self.rnd.random() < 0.005 \
+                    else self._table()
+                tables.append(table)
+                path = csv_dir / '{0}.csv'.format(lang_id)
+                with path.open('w', encoding='utf-8', newline='') as fp:
+                    writer = csv.writer(fp)
+                    writer.writerow(HEADER)
+                    for param, form in table:
+                        writer.writerow([
+                            '{0}-{1}-1'.format(lang_id, param), '', lang_id, param, form, form,
+                            '[]', '', "['chan2019']", '', 'False', 'False', '', str(variety)])
+                        self.forms += 1
+                self.paths.append(path)
+        with (self.dir / 'languages.csv').open('w', encoding='utf-8', newline='') as fp:
+            writer = csv.DictWriter(fp, ['ID', 'Glottocode', 'Name'])
+            writer.writeheader()
+            writer.writerows(self.languages)
+        self._workbooks(int(round(WORKBOOKS * self.scale)))
+        return self
+
+    def _workbooks(self, n):
+        import openpyxl
+        from pynumerals.numerals_utils import XLSX_LABELS
+
+        xlsx_dir = self.dir / 'xlsx'
+        xlsx_dir.mkdir(parents=True, exist_ok=True)
+        for lg, path in zip(self.languages[:n], self.paths):
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.title = XLSX_LABELS['data']
+            cols = ['param', 'form', 'form_comment', 'loan', 'other_form']
+            ws.append([XLSX_LABELS[c] for c in cols])
+            with path.open(encoding='utf-8') as fp:
+                for row in csv.DictReader(fp):
+                    ws.append([int(row['Parameter_ID']), row['Form'], '', '', ''])
+            ws = wb.create_sheet(XLSX_LABELS['metadata'])
+            for label in ['glottocode', 'isocode', 'name', 'sourcefile', 'author', 'base',
+                          'lg_comment']:
+                ws.append([
+                    XLSX_LABELS[label],
+                    dict(glottocode=lg['Glottocode'], name=lg['Name']).get(label, '')])
+            xlsx_path = xlsx_dir / 'numerals-{0}.xlsx'.format(lg['ID'])
+            wb.save(str(xlsx_path))
+            self.xlsx_paths.append(xlsx_path)
+
+
+def _measure(func, *args):
+    """
+    Run `func(*args)`, measuring wall and CPU time.
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    res = func(*args)
+    return res, collections.OrderedDict([
+        ('wall', round(time.perf_counter() - wall, 4)),
+        ('cpu', round(time.process_time() - cpu, 4)),
+    ])
+
+
+def _peak_memory(func, *args):
+    """
+    Run `func(*args)` under `tracemalloc` and return the peak of traced memory in MB.
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        return round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+    finally:
+        tracemalloc.stop()
+
+
+class Pipeline:
+    """
+    The stages of the build, each a method taking the output of the previous stage and returning
+    its own output.
+    """
+    def __init__(self, ds, workers=1):
+        self.ds, self.workers = ds, workers
+        self.lgid_map = None
+
+    def language_mapping(self, _):
+        self.lgid_map = LanguageIDMap.from_languages(self.ds.languages)
+        return self.ds.paths
+
+    def xlsx(self, paths):
+        from lexibank_numerals import convert_workbook
+
+        converter = functools.partial(
+            convert_workbook,
+            form_header=HEADER,
+            lang_header=['ID', 'Glottocode', 'Name'],
+            missing_data=['Ø'])
+        list(convert_workbooks(converter, self.ds.xlsx_paths, workers=self.workers))
+        return paths
+
+    def split(self, paths):
+        with SplitWriter(self.ds.dir / 'split', self.ds.dir / 'index.md') as writer:
+            for path in paths:
+                with path.open(encoding='utf-8') as fp:
+                    rows = list(csv.DictReader(fp))
+                writer.write_csv(path.name, HEADER, rows)
+                writer.add_index_line('* [{0}]({0})'.format(path.name))
+        return paths
+
+    def ingestion(self, paths):
+        return list(read_data_files(
+            paths,
+            workers=self.workers,
+            ignored_lang_ids=set(),
+            valid_languages={lg['ID'] for lg in self.ds.languages},
+            valid_parameters=set(PARAMETERS),
+            missing_data=['Ø']))
+
+    def validation(self, results):
+        """
+        Validation of the rows, as done when adding forms in `Dataset.cmd_makecldf`.
+        """
+        from lexibank_numerals import CustomLexeme
+
+        forms = []
+        for res in results:
+            for lang_id, param_id, value, form, comment, oform, loan, var_id, _ in res.rows:
+                lexeme = CustomLexeme(
+                    ID='{0}-{1}-1'.format(self.lgid_map[lang_id], param_id),
+                    Language_ID=self.lgid_map[lang_id],
+                    Parameter_ID=param_id,
+                    Value=value,
+                    Form=form,
+                    Comment=comment,
+                    Other_Form=oform,
+                    Loan=loan,
+                    Variant_ID=var_id)
+                forms.append(FormRow.from_dict(attr.asdict(lexeme)))
+        return forms
+
+    def duplicate_detection(self, forms):
+        index = FingerprintIndex()
+        for form in forms:
+            index.add_form(form['Language_ID'], form['Parameter_ID'], form['Form'])
+        index.duplicates('raw')
+        index.duplicates('slug')
+        index.similar()
+        return forms
+
+    def sorting(self, forms):
+        buckets = FormBuckets()
+        for form in reversed(forms):
+            buckets.add(form)
+        return list(buckets)
+
+    def writing(self, forms):
+        with (self.ds.dir / 'forms.csv').open('w', encoding='utf-8', newline='') as fp:
+            writer = csv.DictWriter(fp, list(forms[0].keys()))
+            writer.writeheader()
+            writer.writerows(forms)
+        return forms
+
+
+STAGES = [
+    'language_mapping',
+    'xlsx',
+    'split',
+    'ingestion',
+    'validation',
+    'duplicate_detection',
+    'sorting',
+    'writing',
+]
+
+
+def run(directory, scale=1.0, workers=1, memory=True):
+    """
+    Generate a synthetic dataset in `directory` and benchmark all stages on it.
+
+    Since tracing memory allocations slows down Python code considerably, timings are taken in
+    a first run of each stage and - with `memory=True` - peak memory in a second one.
+
+    :return: `dict` with the size of the dataset and the measurements per stage.
+    """
+    ds = Dataset(directory, scale=scale).generate()
+    pipeline = Pipeline(ds, workers=workers)
+    stages, data = collections.OrderedDict(), None
+    for name in STAGES:
+        stage = getattr(pipeline, name)
+        res, stages[name] = _measure(stage, data)
+        if memory:
+            stages[name]['peak_mb'] = _peak_memory(stage, data)
+        data = res
+
+    return collections.OrderedDict([
+        ('scale', scale),
+        ('languages', len(ds.languages)),
+        ('workbooks', len(ds.xlsx_paths)),
+        ('forms', ds.forms),
+        ('workers', workers),
+        ('stages', stages),
+    ])
+
+
+# Modules the dataset module must not load on import - they are only needed to download the
+# data, to check forms or to convert workbooks:
+LAZY_MODULES = ['pynumerals', 'bs4', 'fuzzywuzzy']
+
+_IMPORT = """
+import sys, time, json
+t = time.perf_counter()
+import {0}
+print(json.dumps([time.perf_counter() - t, sorted(sys.modules)]))
+"""
+
+
+def _import(module):
+    return json.loads(subprocess.check_output(
+        [sys.executable, '-c', _IMPORT.format(module)]).decode('utf-8'))
+
+
+def import_time(module='lexibank_numerals', baseline='pylexibank.dataset', repeat=5):
+    """
+    Measure the time to import `module` in a fresh interpreter - the best of `repeat` runs - and
+    compare it with the time to import `baseline`, i.e. the dependencies `module` can't avoid.
+
+    :return: `dict` with the timings in seconds and the `LAZY_MODULES` loaded by the import.
+    """
+    res, modules = {}, None
+    for name in [baseline, module]:
+        timings = []
+        for _ in range(repeat):
+            seconds, modules = _import(name)
+            timings.append(seconds)
+        res[name] = round(min(timings), 4)
+    return collections.OrderedDict([
+        ('module', module),
+        ('seconds', res[module]),
+        ('baseline', baseline),
+        ('baseline_seconds', res[baseline]),
+        ('overhead', round(res[module] - res[baseline], 4)),
+        ('eager_modules', [
+            m for m in LAZY_MODULES if any(n == m or n.startswith(m + '.') for n in modules)]),
+    ])
+
+
+def report(results, repos=None, imports=None):
+    """
+    Wrap benchmark results with metadata about the environment and the git commit.
+    """
+    commit = None
+    if repos:
+        try:
+            commit = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=str(repos), stderr=subprocess.DEVNULL
+            ).decode('utf-8').strip()
+        except (OSError, subprocess.CalledProcessError):  # pragma: no cover
+            pass
+    return collections.OrderedDict([
+        ('commit', commit),
+        ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('results', results),
+        ('imports', imports),
+    ])
+
+
+def compare(old, new):
+    """
+    Compare two reports.
+
+    :return: `list` of `(scale, stage, old wall time, new wall time, ratio)` for the stages \
+    present in both.
+    """
+    res = []
+    old_results = {r['scale']: r for r in old['results']}
+    for r in new['results']:
+        if r['scale'] in old_results:
+            for stage, d in r['stages'].items():
+                o = old_results[r['scale']]['stages'].get(stage)
+                if o:
+                    res.append((
+                        r['scale'], stage, o['wall'], d['wall'],
+                        round(d['wall'] / o['wall'], 2) if o['wall'] else None))
+    return res
@@ -0,0 +1,181 @@
+"""
+Candidate cognate sets of numerals, computed from the forms of the built CLDF data.
+
+For each parameter, forms are compared only within blocks of related varieties - varieties of
+the same Glottolog family, or of the same Glottocode if the family is unknown. Within a block,
+forms are normalised and de-duplicated, and the normalised Levenshtein distances between all
+remaining pairs are computed with `rapidfuzz.process.cdist`, in chunks of rows, so the number of
+comparisons and the size of the distance matrices stay bounded. Pairs with a distance up to the
+threshold are linked, and the connected components spanning at least two varieties are the
+candidate cognate sets.
+
+The sets are written in the format of `etc/cognates.csv`, marked as doubtful, for curators to
+review.
+"""
+import csv
+import pathlib
+import unicodedata
+import collections
+
+from numerals_build.ids import natural_key
+
+COLUMNS = [
+    'ID',
+    'Form_ID',
+    'Form',
+    'Cognateset_ID',
+    'Doubt',
+    'Cognate_Detection_Method',
+    'Source',
+    'Alignment',
+    'Alignment_Method',
+    'Alignment_Source',
+]
+METHOD = 'normalized_levenshtein'
+
+Form = collections.namedtuple('Form', ['id', 'language', 'parameter', 'form'])
+
+
+def normalize(form):
+    """
+    The string compared for a form: NFC-normalised, lowercased, without spaces and hyphens.
+    """
+    return ''.join(
+        c for c in unicodedata.normalize('NFC', form.lower()) if c not in ' -\t')
+
+
+def read_forms(cldf_dir):
+    """
+    Read the forms, grouped by parameter, and the block key of each language from the CLDF data
+    in `cldf_dir`.
+
+    :return: pair (`dict` mapping Parameter_ID to `list` of `Form`, `dict` mapping Language_ID \
+    to block key).
+    """
+    cldf_dir = pathlib.Path(cldf_dir)
+    blocks = {}
+    with (cldf_dir / 'languages.csv').open(encoding='utf-8') as fp:
+        for row in csv.DictReader(fp):
+            blocks[row['ID']] = row.get('Family') or row.get('Glottocode') or \
+                row['ID'].split('-')[0]
+    forms = collections.defaultdict(list)
+    with (cldf_dir / 'forms.csv').open(encoding='utf-8') as fp:
+        for row in csv.DictReader(fp):
+            forms[row['Parameter_ID']].append(
+                Form(row['ID'], row['Language_ID'], row['Parameter_ID'], row['Form']))
+            if row['Language_ID'] not in blocks:
+                blocks[row['Language_ID']] = row['Language_ID'].split('-')[0]
+    return forms, blocks
+
+
+class _Components:
+    """
+    Union-find over the integers `0..n-1`.
+    """
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def similar_pairs(strings, threshold=0.3, chunk=2048, workers=1):
+    """
+    Find the pairs of `strings` with a normalised Levenshtein distance of at most `threshold`.
+
+    :return: generator of index pairs `(i, j)` with `i < j`.
+    """
+    import numpy
+    from rapidfuzz import process, distance
+
+    for start in range(0, len(strings), chunk):
+        m = process.cdist(
+            strings[start:start + chunk],
+            strings,
+            scorer=distance.Levenshtein.normalized_distance,
+            score_cutoff=threshold,
+            dtype=numpy.float32,
+            workers=workers)
+        rows, cols = numpy.nonzero(m <= threshold)
+        rows += start
+        keep = rows < cols
+        yield from zip(rows[keep].tolist(), cols[keep].tolist())
+
+
+def cognate_sets(forms, blocks, threshold=0.3, chunk=2048, workers=1):
+    """
+    Compute the candidate cognate sets for the forms of one parameter.
+
+    :param forms: `list` of `Form`.
+    :param blocks: `dict` mapping Language_ID to block key; forms of different blocks are \
+    never compared.
+    :return: `list` of cognate sets, i.e. lists of `Form` sorted by ID.
+    """
+    by_block = collections.defaultdict(lambda: collections.defaultdict(list))
+    for f in forms:
+        by_block[blocks.get(f.language, f.language)][normalize(f.form)].append(f)
+
+    res = []
+    for block in by_block.values():
+        strings = [s for s in block if s]
+        components = _Components(len(strings))
+        if len(strings) > 1:
+            for i, j in similar_pairs(strings, threshold, chunk=chunk, workers=workers):
+                components.union(i, j)
+        sets = collections.defaultdict(list)
+        for i, s in enumerate(strings):
+            sets[components.find(i)].extend(block[s])
+        for cogset in sets.values():
+            if len({f.language for f in cogset}) > 1:
+                res.append(sorted(cogset, key=lambda f: natural_key(f.id)))
+    return sorted(res, key=lambda c: natural_key(c[0].id))
+
+
+def rows(forms_by_parameter, blocks, threshold=0.3, chunk=2048, workers=1):
+    """
+    Compute the candidate cognate sets for all parameters.
+
+    :return: generator of `dict`s for `etc/cognates.csv`.
+    """
+    for pid in sorted(forms_by_parameter, key=natural_key):
+        sets = cognate_sets(
+            forms_by_parameter[pid], blocks, threshold=threshold, chunk=chunk, workers=workers)
+        for n, cogset in enumerate(sets, start=1):
+            cogset_id = '{0}-{1}'.format(pid, n)
+            for f in cogset:
+                yield collections.OrderedDict([
+                    ('ID', '{0}-{1}'.format(f.id, cogset_id)),
+                    ('Form_ID', f.id),
+                    ('Form', f.form),
+                    ('Cognateset_ID', cogset_id),
+                    ('Doubt', 'true'),
+                    ('Cognate_Detection_Method', '{0}<={1}'.format(METHOD, threshold)),
+                    ('Source', ''),
+                    ('Alignment', ''),
+                    ('Alignment_Method', ''),
+                    ('Alignment_Source', ''),
+                ])
+
+
+def write(path, rows_):
+    """
+    Write cognate rows to `path`.
+
+    :return: number of rows written.
+    """
+    n = 0
+    with pathlib.Path(path).open('w', encoding='utf-8', newline='') as fp:
+        writer = csv.DictWriter(fp, COLUMNS)
+        writer.writeheader()
+        for row in rows_:
+            writer.writerow(row)
+            n += 1
+    return n
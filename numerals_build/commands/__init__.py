@@ -0,0 +1,3 @@
+"""
+cldfbench subcommands for the numerals dataset, available as `cldfbench numerals.<command>`.
+"""
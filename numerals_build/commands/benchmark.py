@@ -0,0 +1,84 @@
+"""
+Benchmark the stages of the build on synthetic channumerals-shaped data at several scales, and
+the import time of the dataset module.
+"""
+import json
+import pathlib
+import tempfile
+
+from numerals_build import benchmark
+
+
+def register(parser):
+    parser.add_argument(
+        '--scales',
+        help="Sizes of the synthetic datasets, as multiples of the 5,352 channumerals varieties "
+             "(pass no value to skip the stage benchmarks)",
+        type=float,
+        nargs='*',
+        default=[1, 5, 20],
+    )
+    parser.add_argument(
+        '--workers',
+        help="Number of processes used to read data files and convert workbooks",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '--no-memory',
+        help="Only measure time, not peak memory",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--imports',
+        help="Also measure the time to import the dataset module",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--output',
+        help="Path of the JSON report",
+        type=pathlib.Path,
+        default=pathlib.Path('benchmark.json'),
+    )
+    parser.add_argument(
+        '--compare',
+        help="JSON report of a previous run to compare timings with",
+        type=pathlib.Path,
+        default=None,
+    )
+
+
+def run(args):
+    results = []
+    for scale in args.scales:
+        args.log.info('benchmarking scale {0}'.format(scale))
+        with tempfile.TemporaryDirectory() as tmp:
+            results.append(benchmark.run(
+                tmp, scale=scale, workers=args.workers, memory=not args.no_memory))
+        for name, stage in results[-1]['stages'].items():
+            args.log.info('{0:>5} {1:<20} {2:>9.2f}s {3}'.format(
+                scale,
+                name,
+                stage['wall'],
+                '{0:.1f}MB'.format(stage['peak_mb']) if 'peak_mb' in stage else ''))
+
+    imports = None
+    if args.imports:
+        imports = benchmark.import_time()
+        args.log.info('import {0}: {1:.3f}s ({2}: {3:.3f}s)'.format(
+            imports['module'], imports['seconds'], imports['baseline'],
+            imports['baseline_seconds']))
+        if imports['eager_modules']:
+            args.log.warning('modules loaded on import: {0}'.format(
+                ', '.join(imports['eager_modules'])))
+
+    report = benchmark.report(results, repos=pathlib.Path(__file__).parent, imports=imports)
+    args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    args.log.info('report written to {0}'.format(args.output))
+
+    if args.compare:
+        old = json.loads(args.compare.read_text(encoding='utf-8'))
+        for scale, name, before, after, ratio in benchmark.compare(old, report):
+            print('{0}\t{1}\t{2:.2f}s\t{3:.2f}s\t{4}'.format(scale, name, before, after, ratio))
@@ -0,0 +1,47 @@
+"""
+Compute candidate cognate sets of numerals from the built CLDF data and write them to
+etc/cognates.csv.
+"""
+import pathlib
+
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build import cognates
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--threshold',
+        help="Maximal normalised edit distance of forms linked as cognate candidates",
+        type=float,
+        default=0.3,
+    )
+    parser.add_argument(
+        '--workers',
+        help="Number of threads used to compute distances (-1 for all CPUs)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '--output',
+        help="Path of the CSV file (default: etc/cognates.csv of the dataset)",
+        type=pathlib.Path,
+        default=None,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    try:
+        import rapidfuzz  # noqa: F401
+    except ImportError:  # pragma: no cover
+        args.log.error(
+            'rapidfuzz is needed to compute cognates, install "lexibank_numerals[cognates]"')
+        return
+    forms, blocks = cognates.read_forms(ds.cldf_dir)
+    output = args.output or ds.etc_dir / 'cognates.csv'
+    n = cognates.write(
+        output,
+        cognates.rows(forms, blocks, threshold=args.threshold, workers=args.workers))
+    args.log.info('{0} cognate candidates written to {1}'.format(n, output))
@@ -0,0 +1,92 @@
+"""
+Report coverage, synonymy and gaps of the last build, from the coverage matrix in .build/.
+"""
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.coverage import CoverageMatrix, FLAGS
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--gaps',
+        help="List languages lacking forms for any of these parameters",
+        nargs='+',
+        metavar='PARAMETER',
+        default=None,
+    )
+    parser.add_argument(
+        '--synonymy',
+        help="List the number of languages with forms and with synonyms per parameter",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--flag',
+        help="List languages and parameters with forms flagged as loan, problematic or "
+             "from an overwrite",
+        choices=list(FLAGS),
+        default=None,
+    )
+    parser.add_argument(
+        '--changes',
+        help="List languages whose coverage changed since the previous build",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--language',
+        help="Restrict --gaps to this language ID",
+        action='append',
+        default=None,
+    )
+
+
+def _known(args, ids, axis, name):
+    """
+    :return: The IDs in `ids` which are in `axis` of the matrix; unknown ones are reported.
+    """
+    if ids is None:
+        return None
+    axis = set(axis)
+    for id_ in ids:
+        if id_ not in axis:
+            args.log.error('unknown {0} {1}'.format(name, id_))
+    return [id_ for id_ in ids if id_ in axis]
+
+
+def run(args):
+    ds = get_dataset(args)
+    path = ds.build_dir / 'coverage.npz'
+    if not path.exists():
+        args.log.error('No coverage matrix found at {0} - run makecldf first'.format(path))
+        return
+    matrix = CoverageMatrix.load(path)
+
+    if args.gaps:
+        parameters = _known(args, args.gaps, matrix.parameters, 'parameter')
+        languages = _known(args, args.language, matrix.languages, 'language')
+        if not parameters or (args.language and not languages):
+            return
+        for lid, params in matrix.gaps(parameters, languages=languages).items():
+            print('{0}\t{1}'.format(lid, ' '.join(params)))
+    elif args.synonymy:
+        print('Parameter_ID\tlanguages\twith_synonyms\tforms_per_language')
+        for pid, (n, syn, mean) in matrix.synonymy().items():
+            print('{0}\t{1}\t{2}\t{3}'.format(pid, n, syn, mean))
+    elif args.flag:
+        for lid, params in matrix.flagged(args.flag).items():
+            print('{0}\t{1}'.format(lid, ' '.join(params)))
+    elif args.changes:
+        previous = ds.build_dir / 'coverage-previous.npz'
+        if not previous.exists():
+            args.log.error('No coverage matrix of a previous build at {0}'.format(previous))
+            return
+        for lid, gained, lost in matrix.changes(CoverageMatrix.load(previous)):
+            if gained is None:
+                print('{0}\tadded or removed'.format(lid))
+            else:
+                print('{0}\t+{1}\t-{2}'.format(lid, ' '.join(gained), ' '.join(lost)))
+    else:
+        for k, v in matrix.statistics().items():
+            print('{0}\t{1}'.format(k, v))
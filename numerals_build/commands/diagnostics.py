@@ -0,0 +1,48 @@
+"""
+Query the findings of the last build, by check and/or language.
+"""
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.diagnostics import Diagnostics, CHECKS, FIELDS
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--code',
+        help="Only list findings of this check",
+        choices=list(CHECKS),
+        default=None,
+    )
+    parser.add_argument(
+        '--language',
+        help="Only list findings for this language ID (as used in the data files)",
+        default=None,
+    )
+    parser.add_argument(
+        '--counts',
+        help="Only list the number of findings per check",
+        action='store_true',
+        default=False,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    path = ds.build_dir / 'diagnostics.json'
+    if not path.exists():
+        args.log.error('No diagnostics found at {0} - run makecldf first'.format(path))
+        return
+    diagnostics = Diagnostics.from_json(path)
+
+    if args.counts:
+        for code, n in diagnostics.counts().items():
+            print('{0}\t{1}'.format(code, n))
+        return
+
+    print('\t'.join(FIELDS))
+    for f in diagnostics.query(code=args.code, language=args.language):
+        print('\t'.join(
+            '' if v is None else '{0}'.format(v)
+            for v in [f.code, CHECKS[f.code].level, f.language, f.parameter, f.file, f.row,
+                      f.form_id, f.value]))
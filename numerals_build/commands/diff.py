@@ -0,0 +1,60 @@
+"""
+Compare the CLDF data of two builds - dataset directories or git revisions - language by
+language.
+"""
+import json
+import pathlib
+
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.diff import Tree, diff
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--old',
+        help="Git revision or directory of the old build",
+        default='HEAD',
+    )
+    parser.add_argument(
+        '--new',
+        help="Git revision or directory of the new build (default: the working tree)",
+        default=None,
+    )
+    parser.add_argument(
+        '--output',
+        help="Path to write the JSON report to",
+        type=pathlib.Path,
+        default=None,
+    )
+
+
+def _tree(ds, spec):
+    if spec is None:
+        return Tree(ds.dir)
+    if pathlib.Path(spec).is_dir():
+        return Tree(spec)
+    return Tree(ds.dir, rev=spec)
+
+
+def run(args):
+    ds = get_dataset(args)
+    report = diff(
+        _tree(ds, args.old), _tree(ds, args.new), cache_dir=ds.build_dir / 'digests')
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=1), encoding='utf-8')
+        args.log.info('report written to {0}'.format(args.output))
+
+    for k, v in report['summary'].items():
+        print('{0}\t{1}'.format(k, v))
+    for lang in report['languages']:
+        print('{0}\t{1}\t+{2}\t-{3}\t~{4}{5}'.format(
+            lang['ID'],
+            lang['status'],
+            len(lang['forms_added']),
+            len(lang['forms_removed']),
+            len(lang['forms_modified']),
+            '\t{0}{1}'.format(lang['overwrite'], ' (changed)' if lang['overwrite_changed'] else '')
+            if lang['overwrite'] else ''))
@@ -0,0 +1,44 @@
+"""
+Run `cldfbench download` for the numerals dataset, with numerals-specific options.
+"""
+from cldfbench.commands import download
+
+
+def register(parser):
+    download.register(parser)
+    parser.add_argument(
+        '--workers',
+        help="Number of processes used to convert the curated xlsx workbooks",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '--source',
+        help="Base URL, directory or release archive (.zip, .tar.gz) to fetch the channumerals "
+             "files from (default: the dataset's channumerals_source)",
+        default=None,
+    )
+    parser.add_argument(
+        '--fetch-workers',
+        help="Number of files fetched concurrently",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        '--streaming',
+        help="Split the upstream forms.csv while reading it row by row, instead of loading and "
+             "sorting all forms first; requires forms to be grouped by language, as in the "
+             "upstream release",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--profile',
+        help="Write a cProfile dump of the command to this path (the JSON report of stage "
+             "timings is always written to .build/)",
+        default=None,
+    )
+
+
+def run(args):
+    download.run(args)
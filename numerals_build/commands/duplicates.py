@@ -0,0 +1,40 @@
+"""
+Report identical and near-duplicate data tables, using the fingerprints of the last build.
+"""
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.fingerprints import FingerprintIndex
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--threshold',
+        help="Minimal estimated similarity of near-duplicate tables",
+        type=float,
+        default=0.8,
+    )
+    parser.add_argument(
+        '--all',
+        help="Also report identical tables listed in the dataset's whitelist",
+        action='store_true',
+        default=False,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    path = ds.build_dir / 'fingerprints.json'
+    if not path.exists():
+        args.log.error('No fingerprints found at {0} - run makecldf first'.format(path))
+        return
+    index = FingerprintIndex.load(path)
+
+    for kind in ['raw', 'slug']:
+        for v in index.duplicates(kind):
+            vj = ", ".join(v)
+            if args.all or vj not in ds.datatable_check_whitelist:
+                print('identical ({0})\t{1}'.format(kind, vj))
+
+    for a, b, sim in index.similar(threshold=args.threshold):
+        print('similar ({0:.2f})\t{1}, {2}'.format(sim, a, b))
@@ -0,0 +1,59 @@
+"""
+Write curator workbooks numerals-<lang_id>.xlsx - with the layout read by `download` - from the
+current data in etc/csv (or raw/csv) and etc/languages.csv.
+"""
+import csv
+import pathlib
+
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.xlsx import convert_workbooks, export_workbook
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        'language',
+        metavar='LANGUAGE_ID',
+        help="IDs of the languages to export (default: all languages with data)",
+        nargs='*',
+    )
+    parser.add_argument(
+        '--workers',
+        help="Number of processes writing workbooks",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '--output',
+        help="Directory to write the workbooks to (default: .build/xlsx of the dataset)",
+        type=pathlib.Path,
+        default=None,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    out = args.output or ds.build_dir / 'xlsx'
+    with (ds.etc_dir / 'languages.csv').open(encoding='utf-8') as fp:
+        languages = {r['ID'].strip(): r for r in csv.DictReader(fp)}
+
+    for lid in args.language:
+        if lid not in languages:
+            args.log.error('unknown language {0}'.format(lid))
+    data_files = ds.data_files()
+    jobs = []
+    for lid in args.language or languages:
+        if lid not in languages:
+            continue
+        data_file = data_files.resolve(lid)
+        if data_file is None:
+            args.log.warning('no data file for language {0}'.format(lid))
+            continue
+        jobs.append((
+            out / 'numerals-{0}.xlsx'.format(lid), dict(languages[lid], ID=lid), data_file.path))
+
+    n = 0
+    for _ in convert_workbooks(export_workbook, jobs, workers=args.workers):
+        n += 1
+    args.log.info('{0} workbooks written to {1}'.format(n, out))
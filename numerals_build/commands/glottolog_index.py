@@ -0,0 +1,22 @@
+"""
+Generate the local Glottolog index `etc/glottolog.sqlite` from a Glottolog release.
+"""
+from cldfbench.cli_util import add_dataset_spec, add_catalog_spec, get_dataset
+
+from numerals_build.glottolog import GlottologIndex
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    add_catalog_spec(parser, 'glottolog')
+
+
+def run(args):
+    ds = get_dataset(args)
+    index = GlottologIndex.build(
+        ds.glottolog_index_path,
+        args.glottolog.api.languoids(),
+        version=args.glottolog.describe(),
+        url=args.glottolog.url)
+    args.log.info('{0} languoids of Glottolog {1} written to {2}'.format(
+        len(index), index.version, ds.glottolog_index_path))
@@ -0,0 +1,111 @@
+"""
+Run `lexibank.makecldf` for the numerals dataset, with numerals-specific build options.
+
+Languages are enriched from the local Glottolog index `etc/glottolog.sqlite` - unless a
+Glottolog clone is passed explicitly via `--glottolog`. Without the index, the Glottolog clone from
+the cldfbench config is used, as for other lexibank datasets. An index generated from an older
+Glottolog release than the configured clone is refused.
+"""
+import contextlib
+
+from cldfbench.catalogs import Glottolog
+from cldfbench.cli_util import IGNORE_MISSING, get_dataset
+from cldfcatalog import Config
+from clldutils.clilib import ParserError
+from pylexibank.commands import makecldf
+
+from numerals_build.glottolog import GlottologIndex, version_key
+
+
+def register(parser):
+    makecldf.register(parser)
+    # Don't look up a Glottolog clone in the config before knowing whether the index exists:
+    parser.set_defaults(glottolog=IGNORE_MISSING)
+    parser.add_argument(
+        '--workers',
+        help="Number of processes used to parse and validate the per-language data files; "
+             "adding the forms stays serial, so this only pays off with several CPUs "
+             "(default: 1, i.e. read in-process)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '--reuse-parsed',
+        help="Only parse and validate data files which changed since the last build, re-using "
+             "the rows cached in .build/manifest for the others (all forms are still added to "
+             "the CLDF data, which is written in full)",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--streaming',
+        help="Spill validated forms to disk after each data file and stream them into "
+             "forms.csv language by language, to bound peak memory",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--profile',
+        help="Write a cProfile dump of the command to this path (the JSON report of stage "
+             "timings is always written to .build/)",
+        default=None,
+    )
+
+
+def _configured_glottolog(args):
+    """
+    :return: Path of the Glottolog clone in the cldfbench config - or `None`.
+    """
+    if getattr(args, 'no_config', False):
+        return None
+    try:
+        return Config.from_file().get_clone('glottolog')
+    except KeyError:
+        return None
+
+
+def _check_index_version(args, index):
+    """
+    Refuse an index generated from an older Glottolog release than the configured clone.
+    """
+    clone = _configured_glottolog(args)
+    if clone is None:
+        return
+    clone_version = getattr(args, 'glottolog_version', None)
+    if not clone_version:
+        try:
+            clone_version = Glottolog(clone).describe()
+        except ValueError:  # Not a git clone, so there's no release to compare with.
+            return
+    if clone_version == index.version:
+        return
+    old, new = version_key(index.version), version_key(clone_version)
+    if old is not None and new is not None and old < new:
+        raise ParserError(
+            'Glottolog index {0} was generated from Glottolog {1}, but the configured clone is '
+            'at {2} - re-generate it with numerals.glottolog_index'.format(
+                index.path, index.version, clone_version))
+    args.log.warning('Glottolog index {0} was generated from Glottolog {1}, the configured '
+                     'clone is at {2}'.format(index.path, index.version, clone_version))
+
+
+def run(args):
+    with contextlib.ExitStack() as stack:
+        if args.glottolog is None:
+            path = get_dataset(args).glottolog_index_path
+            if path.exists():
+                args.glottolog = stack.enter_context(contextlib.closing(GlottologIndex(path)))
+                _check_index_version(args, args.glottolog)
+                args.log.info(
+                    'using Glottolog {0} from {1}'.format(args.glottolog.version, path))
+            else:
+                clone = _configured_glottolog(args)
+                if clone is None:
+                    raise ParserError(
+                        'No Glottolog index at {0} and no Glottolog clone configured - pass a '
+                        'Glottolog clone via --glottolog or generate the index with '
+                        'numerals.glottolog_index'.format(path))
+                args.glottolog = stack.enter_context(
+                    Glottolog(clone, getattr(args, 'glottolog_version', None)))
+                args.log.info('using Glottolog clone {0}'.format(clone))
+        makecldf.run(args)
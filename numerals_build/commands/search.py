@@ -0,0 +1,72 @@
+"""
+Search the forms, values, other forms and comments of the built CLDF data for a substring, a
+slug or - fuzzily - similar strings, using the n-gram index in .build/search.sqlite.
+"""
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.diff import Tree
+from numerals_build.search import SearchIndex
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument('query', metavar='QUERY', help="String to search for")
+    parser.add_argument(
+        '--slug',
+        help="Compare slugs, i.e. ignore case, diacritics, punctuation and whitespace",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--fuzzy',
+        help="Find strings within this edit distance of the query, instead of substrings",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        '--parameter',
+        help="Only search forms for this Parameter_ID",
+        action='append',
+        default=None,
+    )
+    parser.add_argument(
+        '--family',
+        help="Only search forms of languages of this family",
+        action='append',
+        default=None,
+    )
+    parser.add_argument(
+        '--limit',
+        help="Maximal number of matches to list (0 for all)",
+        type=int,
+        default=100,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    if not (ds.cldf_dir / 'forms.csv').exists():
+        args.log.error('No CLDF data found in {0} - run makecldf first'.format(ds.cldf_dir))
+        return
+    index = SearchIndex(ds.build_dir / 'search.sqlite')
+    try:
+        added, removed, changed = index.update(Tree(ds.dir), cache_dir=ds.build_dir / 'digests')
+        if added or removed or changed:
+            args.log.info('search index updated: {0} languages added, {1} removed, {2} '
+                          'changed'.format(len(added), len(removed), len(changed)))
+        hits = index.search(
+            args.query,
+            normalize=args.slug,
+            fuzzy=args.fuzzy,
+            parameters=args.parameter,
+            families=args.family)
+    finally:
+        index.close()
+
+    print('ID\tLanguage_ID\tParameter_ID\tField\tText' + ('\tDistance' if args.fuzzy else ''))
+    for hit in hits[:args.limit] if args.limit else hits:
+        print('\t'.join(
+            [hit.form_id, hit.language, hit.parameter, hit.field, hit.text] +
+            ([str(hit.distance)] if args.fuzzy else [])))
+    if args.limit and len(hits) > args.limit:
+        args.log.info('{0} of {1} matches listed'.format(args.limit, len(hits)))
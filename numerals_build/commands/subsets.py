@@ -0,0 +1,53 @@
+"""
+Export the languages and forms of families or macroareas of the built CLDF data for curation,
+with curator columns for bases and comments.
+"""
+from cldfbench.cli_util import add_dataset_spec, get_dataset
+
+from numerals_build.subsets import Subset, export
+
+
+def register(parser):
+    add_dataset_spec(parser)
+    parser.add_argument(
+        '--family',
+        help="Family to export, as NAME[:CURATOR] (default: the dataset's family_subsets)",
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '--macroarea',
+        help="Macroarea to export, as NAME[:CURATOR]",
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '--curator',
+        help="Curator for subsets specified without one",
+        default='Curator',
+    )
+    parser.add_argument(
+        '--output',
+        help="Directory to write the subsets to (default: families/ of the dataset)",
+        default=None,
+    )
+    parser.add_argument(
+        '--no-forms',
+        help="Only export the languages",
+        action='store_true',
+        default=False,
+    )
+
+
+def run(args):
+    ds = get_dataset(args)
+    subsets = [Subset.from_spec('Family', s, args.curator) for s in args.family] + \
+        [Subset.from_spec('Macroarea', s, args.curator) for s in args.macroarea]
+    if not subsets:
+        subsets = [Subset('Family', name, curator) for name, curator in ds.family_subsets]
+    out = args.output or ds.dir / 'families'
+    counts = export(ds.cldf_dir, out, subsets, forms=not args.no_forms)
+    for stem, (languages, forms) in counts.items():
+        args.log.info('{0}: {1} languages, {2} forms'.format(stem, languages, forms))
+        if not languages:
+            args.log.warning('no languages for subset {0}'.format(stem))
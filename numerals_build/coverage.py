@@ -0,0 +1,184 @@
+"""
+The coverage of the parameters by the languages of the dataset, as a dense matrix.
+
+`CoverageMatrix` holds, per language and parameter, the number of forms (`counts`) and a
+bitmap of flags of these forms (`flags`): whether any is a loan, is problematic, or comes from an
+overwrite in `etc/csv`. It is built as a side product of `cmd_makecldf` and saved as NumPy
+arrays in `.build/coverage.npz`, so coverage, synonymy and gap reports don't need to re-read
+`cldf/forms.csv`. The matrix of the previous build is kept as `.build/coverage-previous.npz`, to
+report how coverage changed.
+"""
+import pathlib
+import collections
+
+import numpy
+
+from numerals_build.ids import natural_key
+
+LOAN = 1
+PROBLEMATIC = 2
+OVERWRITE = 4
+FLAGS = collections.OrderedDict([
+    ('loan', LOAN), ('problematic', PROBLEMATIC), ('overwrite', OVERWRITE)])
+
+
+class CoverageMatrix:
+    """
+    :param languages: Language IDs, indexing the rows.
+    :param parameters: Parameter IDs, indexing the columns.
+    """
+    def __init__(self, languages, parameters, counts=None, flags=None):
+        self.languages = list(languages)
+        self.parameters = list(parameters)
+        shape = (len(self.languages), len(self.parameters))
+        self.counts = numpy.zeros(shape, dtype=numpy.uint16) if counts is None else counts
+        self.flags = numpy.zeros(shape, dtype=numpy.uint8) if flags is None else flags
+        self._lindex = {lid: i for i, lid in enumerate(self.languages)}
+        self._pindex = {pid: i for i, pid in enumerate(self.parameters)}
+        # Forms are collected as index lists and added to the arrays in bulk by `finish`:
+        self._added = ([], [], [])
+
+    def add(self, language, parameter, loan=False, problematic=False, overwrite=False):
+        self._added[0].append(self._lindex[language])
+        self._added[1].append(self._pindex[parameter])
+        self._added[2].append(
+            (LOAN if loan else 0) | (PROBLEMATIC if problematic else 0) |
+            (OVERWRITE if overwrite else 0))
+
+    def finish(self):
+        """
+        Add the forms collected by `add` to the matrix.
+        """
+        if self._added[0]:
+            idx = (numpy.array(self._added[0]), numpy.array(self._added[1]))
+            numpy.add.at(self.counts, idx, 1)
+            numpy.bitwise_or.at(self.flags, idx, numpy.array(self._added[2], dtype=numpy.uint8))
+        self._added = ([], [], [])
+        return self
+
+    def save(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.finish()
+        with path.open('wb') as fp:
+            numpy.savez_compressed(
+                fp,
+                languages=numpy.array(self.languages, dtype=str),
+                parameters=numpy.array(self.parameters, dtype=str),
+                counts=self.counts,
+                flags=self.flags)
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(str(path), allow_pickle=False) as data:
+            return cls(
+                data['languages'].tolist(),
+                data['parameters'].tolist(),
+                counts=data['counts'],
+                flags=data['flags'])
+
+    def _rows(self, languages=None):
+        if languages is None:
+            return numpy.arange(len(self.languages))
+        return numpy.array([self._lindex[lid] for lid in languages], dtype=int)
+
+    def _columns(self, parameters=None):
+        if parameters is None:
+            return numpy.arange(len(self.parameters))
+        return numpy.array([self._pindex[pid] for pid in parameters], dtype=int)
+
+    def count(self, language, parameter):
+        return int(self.counts[self._lindex[language], self._pindex[parameter]])
+
+    def flagged(self, flag, parameters=None):
+        """
+        :return: `dict` mapping language IDs to the parameters with forms flagged with `flag`.
+        """
+        cols = self._columns(parameters)
+        rows, pcols = numpy.nonzero(self.flags[:, cols] & FLAGS.get(flag, flag))
+        res = collections.OrderedDict()
+        for r, c in zip(rows.tolist(), pcols.tolist()):
+            res.setdefault(self.languages[r], []).append(self.parameters[cols[c]])
+        return res
+
+    def coverage(self, languages=None, parameters=None):
+        """
+        :return: `OrderedDict` mapping language IDs to the number of `parameters` with forms.
+        """
+        rows = self._rows(languages)
+        covered = (self.counts[numpy.ix_(rows, self._columns(parameters))] > 0).sum(axis=1)
+        return collections.OrderedDict(
+            (self.languages[r], int(n)) for r, n in zip(rows.tolist(), covered.tolist()))
+
+    def gaps(self, parameters=None, languages=None):
+        """
+        :return: `OrderedDict` mapping the IDs of languages lacking forms for any of \
+        `parameters` to the list of these parameters.
+        """
+        rows, cols = self._rows(languages), self._columns(parameters)
+        missing = self.counts[numpy.ix_(rows, cols)] == 0
+        res = collections.OrderedDict()
+        for i in numpy.nonzero(missing.any(axis=1))[0].tolist():
+            res[self.languages[rows[i]]] = [
+                self.parameters[cols[j]] for j in numpy.nonzero(missing[i])[0].tolist()]
+        return res
+
+    def synonymy(self, parameters=None):
+        """
+        :return: `OrderedDict` mapping parameter IDs to triples (number of languages with \
+        forms, number of languages with more than one form, mean number of forms per language \
+        with forms).
+        """
+        cols = self._columns(parameters)
+        counts = self.counts[:, cols]
+        covered = (counts > 0).sum(axis=0)
+        res = collections.OrderedDict()
+        for j, pid in enumerate([self.parameters[c] for c in cols.tolist()]):
+            n = int(covered[j])
+            res[pid] = (
+                n,
+                int((counts[:, j] > 1).sum()),
+                round(float(counts[:, j].sum()) / n, 3) if n else 0.0)
+        return res
+
+    def statistics(self):
+        """
+        The statistics of a lexibank README, computed from the matrix.
+        """
+        covered = self.counts > 0
+        languages = covered.any(axis=1)
+        per_language = covered.sum(axis=1)[languages]
+        si = (self.counts.sum(axis=1)[languages] / per_language).mean() if languages.any() \
+            else 0.0
+        return collections.OrderedDict([
+            ('varieties', int(languages.sum())),
+            ('concepts', int(covered.any(axis=0).sum())),
+            ('lexemes', int(self.counts.sum(dtype=numpy.int64))),
+            ('synonymy', round(float(si), 2)),
+            ('loans', int(((self.flags & LOAN) > 0).sum())),
+            ('problematic', int(((self.flags & PROBLEMATIC) > 0).sum())),
+        ])
+
+    def changes(self, old):
+        """
+        Compare with the matrix `old` of a previous build.
+
+        :return: `list` of triples (language ID, parameters gained, parameters lost) for the \
+        languages whose coverage changed, with `None` for languages missing in one of the \
+        matrices.
+        """
+        res = []
+        for lid in sorted(set(self.languages) | set(old.languages), key=natural_key):
+            if lid not in old._lindex or lid not in self._lindex:
+                res.append((lid, None, None))
+                continue
+            new_p = {
+                self.parameters[j] for j in numpy.nonzero(self.counts[self._lindex[lid]])[0]}
+            old_p = {
+                old.parameters[j] for j in numpy.nonzero(old.counts[old._lindex[lid]])[0]}
+            if new_p != old_p:
+                res.append((
+                    lid,
+                    sorted(new_p - old_p, key=natural_key),
+                    sorted(old_p - new_p, key=natural_key)))
+        return res
@@ -0,0 +1,104 @@
+"""
+Index of the per-language data files: the overwrites in `etc/csv` and the raw data files in
+`raw/csv`.
+
+`DataFileIndex` lists each directory once with `os.scandir` - instead of probing for
+`<ID>.csv` in both directories for each of the ~5,400 languages - and resolves languages to their
+data files in memory. mtime and size of a file are read from its directory entry when first
+needed (e.g. by the build manifest of `makecldf --reuse-parsed`), and then cached.
+
+The index also reports orphans: data files not referenced by any language row, and language rows
+without a data file.
+"""
+import os
+import pathlib
+import collections
+
+import attr
+
+from numerals_build.ids import natural_key
+
+
+@attr.s(slots=True)
+class DataFile:
+    """
+    A data file `<lang_id>.csv`; `overwrite` is `True` for files in `etc/csv`.
+    """
+    path = attr.ib()
+    lang_id = attr.ib()
+    overwrite = attr.ib()
+    _entry = attr.ib(default=None, repr=False)
+    _stat = attr.ib(default=None, repr=False)
+
+    def stat(self):
+        """
+        :return: pair (mtime in ns, size in bytes).
+        """
+        if self._stat is None:
+            st = self._entry.stat() if self._entry is not None else self.path.stat()
+            self._stat = (st.st_mtime_ns, st.st_size)
+        return self._stat
+
+    @property
+    def mtime_ns(self):
+        return self.stat()[0]
+
+    @property
+    def size(self):
+        return self.stat()[1]
+
+
+def _scan(directory, overwrite):
+    res = {}
+    try:
+        entries = os.scandir(str(directory))
+    except FileNotFoundError:
+        return res
+    with entries:
+        for entry in entries:
+            if entry.name.endswith('.csv') and entry.is_file():
+                lang_id = entry.name[:-4]
+                res[lang_id] = DataFile(
+                    pathlib.Path(directory) / entry.name, lang_id, overwrite, entry=entry)
+    return collections.OrderedDict(sorted(res.items(), key=lambda i: natural_key(i[0])))
+
+
+class DataFileIndex:
+    """
+    :param etc_dir: Directory of the overwrites, e.g. `etc/csv`.
+    :param raw_dir: Directory of the raw data files, e.g. `raw/csv`.
+    """
+    def __init__(self, etc_dir, raw_dir):
+        self.overwrites = _scan(etc_dir, True)
+        self.raw = _scan(raw_dir, False)
+        self._by_path = {
+            f.path: f for files in [self.overwrites, self.raw] for f in files.values()}
+
+    def resolve(self, lang_id):
+        """
+        :return: The `DataFile` for a language - the overwrite if there is one - or `None`.
+        """
+        return self.overwrites.get(lang_id) or self.raw.get(lang_id)
+
+    def stat(self, path):
+        """
+        :return: pair (mtime in ns, size in bytes) of `path`, from the index if possible.
+        """
+        f = self._by_path.get(pathlib.Path(path))
+        if f:
+            return f.stat()
+        st = pathlib.Path(path).stat()
+        return (st.st_mtime_ns, st.st_size)
+
+    def orphans(self, lang_ids):
+        """
+        :param lang_ids: IDs of the language rows.
+        :return: pair (`list` of `DataFile`s not referenced by any language row, `list` of \
+        language IDs without data file).
+        """
+        lang_ids = set(lang_ids)
+        files = [
+            f for files in [self.overwrites, self.raw] for f in files.values()
+            if f.lang_id not in lang_ids]
+        missing = [lid for lid in lang_ids if lid not in self.overwrites and lid not in self.raw]
+        return files, sorted(missing, key=natural_key)
@@ -0,0 +1,217 @@
+"""
+Findings of the checks run while building the CLDF data.
+
+Each finding is a typed record - check code, language, parameter, data file, line number, form
+ID and the offending value - stored in a `Diagnostics` table indexed by code and by language.
+The table is written to CSV and JSON next to the build, for curators to filter, and logged in
+the same format as the build always did, grouped by check.
+"""
+import csv
+import json
+import pathlib
+import collections
+
+import attr
+
+from numerals_build.ids import natural_key
+
+FIELDS = ['code', 'level', 'language', 'parameter', 'file', 'row', 'form_id', 'value']
+
+
+def parameter_key(param_id):
+    """
+    Sort key for Parameter_IDs which may be invalid: numeric IDs first, in numeric order, then
+    all others - including empty ones - in string order.
+    """
+    param_id = param_id or ''
+    return (not param_id.isdigit(), int(param_id) if param_id.isdigit() else param_id)
+
+
+@attr.s(slots=True, frozen=True)
+class Finding:
+    code = attr.ib()
+    language = attr.ib(default=None)
+    parameter = attr.ib(default=None)
+    file = attr.ib(default=None)
+    row = attr.ib(default=None)
+    form_id = attr.ib(default=None)
+    value = attr.ib(default=None)
+
+
+@attr.s(slots=True, frozen=True)
+class Check:
+    """
+    How findings of a check are reported: log level, a function formatting the log message and
+    a sort key for the findings - or `None` to keep them in the order they were found.
+    """
+    level = attr.ib()
+    message = attr.ib()
+    key = attr.ib(default=None)
+
+
+# The checks, in the order in which their findings are logged at the end of a build:
+CHECKS = collections.OrderedDict([
+    ('unknown_base', Check(
+        'warn', lambda f: "Base '{0}' is unknown for {1}".format(f.value, f.language))),
+    ('identical_tables', Check(
+        'warn', lambda f: "Check identical data tables in lang_ids: {0}".format(f.value))),
+    ('identical_tables_slug', Check(
+        'warn', lambda f: "Check identical data tables in lang_ids (slug): {0}".format(f.value))),
+    ('changed_glottocode', Check(
+        'info', lambda f: "changed {0} to {1}".format(f.language, f.value))),
+    ('unknown_glottocode', Check(
+        'warn', lambda f: "Glottocode {0} of {1} is not in Glottolog".format(
+            f.value, f.language))),
+    ('ignored_language', Check(
+        'info', lambda f: "removed ID {0}".format(f.language))),
+    ('no_glottocode', Check(
+        'info', lambda f: "no Glottolog code for ID {0}".format(f.language))),
+    ('problematic_form', Check(
+        'warn',
+        lambda f: "{0} -> {1}".format(f.form_id, f.value),
+        lambda f: natural_key(f.form_id))),
+    ('unknown_parameter', Check(
+        'warn',
+        lambda f: "Parameter_ID {0} for {1} unknown".format(f.parameter, f.language),
+        lambda f: parameter_key(f.parameter))),
+    ('misaligned_overwrite', Check(
+        'warn',
+        lambda f: "check overwrite {0} for misalignments".format(f.language),
+        lambda f: f.language)),
+    ('misaligned_columns', Check(
+        'warn',
+        lambda f: "check {0} for number of colums".format(f.file),
+        lambda f: f.file)),
+    ('unknown_language', Check(
+        'warn',
+        lambda f: "check Language_ID {0} in overwrite {1}".format(
+            f.language, pathlib.PurePosixPath(f.file).name),
+        lambda f: pathlib.PurePosixPath(f.file).name)),
+    ('form_length', Check(
+        'warn',
+        lambda f: "check Form in {0}".format(pathlib.PurePosixPath(f.file).name),
+        lambda f: pathlib.PurePosixPath(f.file).name)),
+    ('other_form_brackets', Check(
+        'warn',
+        lambda f: "check Other_Form for [] in {0}".format(pathlib.PurePosixPath(f.file).name),
+        lambda f: pathlib.PurePosixPath(f.file).name)),
+    ('no_data', Check(
+        'warn', lambda f: "no data for {0}".format(f.language), lambda f: f.language)),
+    ('orphan_data_file', Check(
+        'warn',
+        lambda f: "no language for data file {0}".format(f.file),
+        lambda f: f.file)),
+])
+
+
+class Diagnostics:
+    """
+    A table of findings, indexed by check code and by language.
+    """
+    def __init__(self):
+        self.findings = []
+        self._by_code = collections.defaultdict(list)
+        self._by_language = collections.defaultdict(list)
+        self._logged = set()
+
+    def __len__(self):
+        return len(self.findings)
+
+    def __iter__(self):
+        return iter(self.findings)
+
+    def add(self, code, log=None, **kw):
+        """
+        Record a finding for check `code`; if `log` is passed, it is logged right away, and not
+        again by `Diagnostics.log`.
+        """
+        if code not in CHECKS:
+            raise ValueError('unknown check {0}'.format(code))
+        finding = Finding(code, **kw)
+        i = len(self.findings)
+        self.findings.append(finding)
+        self._by_code[code].append(i)
+        if finding.language:
+            self._by_language[finding.language].append(i)
+        if log is not None:
+            self._log(log, finding)
+            self._logged.add(i)
+        return finding
+
+    def query(self, code=None, language=None):
+        """
+        :return: `list` of findings for check `code` and/or `language`, in the order recorded.
+        """
+        if code is None and language is None:
+            return list(self.findings)
+        if code is None:
+            idx = self._by_language.get(language, [])
+        elif language is None:
+            idx = self._by_code.get(code, [])
+        else:
+            idx = sorted(
+                set(self._by_code.get(code, [])) & set(self._by_language.get(language, [])))
+        return [self.findings[i] for i in idx]
+
+    def counts(self):
+        return collections.OrderedDict(
+            (code, len(self._by_code[code])) for code in CHECKS if code in self._by_code)
+
+    @staticmethod
+    def _log(log, finding):
+        check = CHECKS[finding.code]
+        getattr(log, check.level)(check.message(finding))
+
+    def log(self, log):
+        """
+        Log the findings not logged yet, grouped by check and sorted per check. Findings with
+        the same message - e.g. several lines of one file - are logged once.
+        """
+        for code, check in CHECKS.items():
+            idx = [i for i in self._by_code.get(code, []) if i not in self._logged]
+            findings = [self.findings[i] for i in idx]
+            if check.key:
+                findings = sorted(findings, key=check.key)
+            seen = set()
+            for finding in findings:
+                msg = check.message(finding)
+                if msg not in seen:
+                    getattr(log, check.level)(msg)
+                    seen.add(msg)
+            self._logged.update(idx)
+
+    def _rows(self):
+        for f in self.findings:
+            yield collections.OrderedDict([
+                ('code', f.code),
+                ('level', CHECKS[f.code].level),
+                ('language', f.language),
+                ('parameter', f.parameter),
+                ('file', f.file),
+                ('row', f.row),
+                ('form_id', f.form_id),
+                ('value', f.value),
+            ])
+
+    def write_csv(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), 'w', encoding='utf-8', newline='') as fp:
+            writer = csv.DictWriter(fp, FIELDS)
+            writer.writeheader()
+            writer.writerows(self._rows())
+
+    def write_json(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(dict(counts=self.counts(), findings=list(self._rows())), indent=1),
+            encoding='utf-8')
+
+    @classmethod
+    def from_json(cls, path):
+        res = cls()
+        for row in json.loads(pathlib.Path(path).read_text(encoding='utf-8'))['findings']:
+            del row['level']
+            res.add(**row)
+        return res
@@ -0,0 +1,259 @@
+"""
+Differences between two builds of the CLDF data, for release review.
+
+A build is summarised as a `Snapshot`: per language, a digest of its row in `languages.csv`, a
+digest of its forms and the number of forms. Snapshots are cached in `.build/digests/`, keyed by
+the git blob hashes of the CLDF files, so the digests of a build - or of a git revision - are
+computed only once. Comparing two builds first compares their snapshots to find the languages
+which were added, removed or changed; only the rows of changed languages are then read and
+compared form by form.
+
+Either side of a comparison is a `Tree` - a directory with the dataset, or a git revision of its
+repository. For each changed language, the report names the overwrite in `etc/csv` and whether
+it changed between the two trees, to tell curation from changes in the upstream data. Renumbered
+language IDs are mapped back to the names of the data files with the `language-ids.csv` written
+to `.build/` by `makecldf`, which is only available for directory trees.
+"""
+import io
+import csv
+import json
+import pathlib
+import hashlib
+import subprocess
+import collections
+
+from numerals_build.ids import natural_key
+
+DIGEST_VERSION = 1
+FORMS = 'cldf/forms.csv'
+LANGUAGES = 'cldf/languages.csv'
+LANGUAGE_IDS = '.build/language-ids.csv'
+OVERWRITES = 'etc/csv'
+
+
+def _lf_chunks(fp, size=1 << 20):
+    """
+    Iterate the content of `fp` in chunks, with CRLF line endings converted to LF.
+    """
+    carry = b''
+    for chunk in iter(lambda: fp.read(size), b''):
+        chunk = carry + chunk
+        # A CR at the end of the chunk may be the first half of a CRLF:
+        chunk, carry = (chunk[:-1], b'\r') if chunk.endswith(b'\r') else (chunk, b'')
+        yield chunk.replace(b'\r\n', b'\n')
+    if carry:
+        yield carry
+
+
+def blob_hash(path):
+    """
+    The git blob hash of a file, as computed by `git hash-object` for a text file.
+
+    The repository checks out CSV files with CRLF line endings (`*.csv text eol=crlf`) while
+    blobs are stored with LF, so line endings are normalised before hashing - otherwise a file
+    in the working tree would never match its blob in a revision.
+    """
+    path = pathlib.Path(path)
+    with path.open('rb') as fp:
+        size = sum(len(chunk) for chunk in _lf_chunks(fp))
+    sha = hashlib.sha1('blob {0}\0'.format(size).encode('ascii'))
+    with path.open('rb') as fp:
+        for chunk in _lf_chunks(fp):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class Tree:
+    """
+    The files of the dataset in directory `repos`, or - with `rev` - in a git revision of it.
+    """
+    def __init__(self, repos, rev=None):
+        self.repos, self.rev = pathlib.Path(repos), rev
+
+    def __str__(self):
+        return self.rev or str(self.repos)
+
+    def _git(self, *args):
+        return subprocess.check_output(
+            ['git'] + list(args), cwd=str(self.repos), stderr=subprocess.DEVNULL)
+
+    def blob(self, path):
+        """
+        :return: The blob hash of the file at `path` - or `None` if it doesn't exist.
+        """
+        if self.rev:
+            try:
+                return self._git('rev-parse', '{0}:{1}'.format(self.rev, path)).decode().strip()
+            except subprocess.CalledProcessError:
+                return None
+        p = self.repos / path
+        return blob_hash(p) if p.exists() else None
+
+    def blobs(self, directory):
+        """
+        :return: `dict` mapping the names of the files in `directory` to their blob hashes.
+        """
+        if self.rev:
+            res = {}
+            try:
+                out = self._git('ls-tree', '{0}:{1}'.format(self.rev, directory)).decode('utf-8')
+            except subprocess.CalledProcessError:
+                return res
+            for line in out.splitlines():
+                meta, _, name = line.partition('\t')
+                res[name] = meta.split()[2]
+            return res
+        d = self.repos / directory
+        return {p.name: blob_hash(p) for p in d.iterdir() if p.is_file()} if d.exists() else {}
+
+    def rows(self, path):
+        """
+        Iterate the rows of the CSV file at `path` as `dict`s.
+        """
+        if self.rev:
+            proc = subprocess.Popen(
+                ['git', 'cat-file', 'blob', self.blob(path)],
+                cwd=str(self.repos),
+                stdout=subprocess.PIPE)
+            try:
+                yield from csv.DictReader(io.TextIOWrapper(proc.stdout, encoding='utf-8'))
+            finally:
+                proc.stdout.close()
+                proc.wait()
+        else:
+            with (self.repos / path).open(encoding='utf-8') as fp:
+                yield from csv.DictReader(fp)
+
+    def original_ids(self):
+        """
+        :return: `dict` mapping CLDF language IDs to the IDs used in the data files.
+        """
+        if not self.blob(LANGUAGE_IDS):
+            return {}
+        return {r['ID']: r['Original_ID'] for r in self.rows(LANGUAGE_IDS)}
+
+
+def _digest(row):
+    return hashlib.md5('\x1f'.join(
+        '{0}\x1e{1}'.format(k, v) for k, v in sorted(row.items())).encode('utf-8')).digest()
+
+
+class Snapshot:
+    """
+    Per-language digests of a build: `languages` maps language IDs to triples (digest of the
+    `languages.csv` row, digest of the forms, number of forms).
+
+    The forms digest is the sum of the digests of the rows, so it doesn't depend on their order.
+    """
+    def __init__(self, key, languages):
+        self.key = key
+        self.languages = languages
+
+    @classmethod
+    def from_tree(cls, tree, cache_dir=None):
+        """
+        Compute the snapshot of `tree` - or load it from `cache_dir`.
+        """
+        blobs = [tree.blob(LANGUAGES), tree.blob(FORMS)]
+        if not all(blobs):
+            raise ValueError('no CLDF data in {0}'.format(tree))
+        key = '-'.join(blobs)
+        cached = pathlib.Path(cache_dir) / '{0}.json'.format(key) if cache_dir else None
+        if cached and cached.exists():
+            d = json.loads(cached.read_text(encoding='utf-8'))
+            if d['version'] == DIGEST_VERSION:
+                return cls(key, {k: tuple(v) for k, v in d['languages'].items()})
+
+        meta = {r['ID']: _digest(r).hex() for r in tree.rows(LANGUAGES)}
+        forms, counts = collections.Counter(), collections.Counter()
+        for row in tree.rows(FORMS):
+            forms[row['Language_ID']] += int.from_bytes(_digest(row), 'big')
+            counts[row['Language_ID']] += 1
+        res = cls(key, {
+            lid: (meta.get(lid), '{0:032x}'.format(forms[lid] % (1 << 128)), counts[lid])
+            for lid in sorted(set(meta) | set(forms), key=natural_key)})
+        if cached:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            cached.write_text(json.dumps(
+                dict(version=DIGEST_VERSION, languages=res.languages)), encoding='utf-8')
+        return res
+
+    def compare(self, other):
+        """
+        :return: triple (IDs of languages only in `self`, only in `other`, in both but with \
+        different digests).
+        """
+        old, new = set(self.languages), set(other.languages)
+        changed = [
+            lid for lid in old & new if tuple(self.languages[lid]) != tuple(other.languages[lid])]
+        return (
+            sorted(old - new, key=natural_key),
+            sorted(new - old, key=natural_key),
+            sorted(changed, key=natural_key))
+
+
+def _changes(old, new):
+    return collections.OrderedDict(
+        (k, [old.get(k), new.get(k)])
+        for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k))
+
+
+def _forms(tree, languages):
+    res = collections.defaultdict(dict)
+    for row in tree.rows(FORMS):
+        if row['Language_ID'] in languages:
+            res[row['Language_ID']][row['ID']] = row
+    return res
+
+
+def diff(old, new, cache_dir=None):
+    """
+    Compare the CLDF data of the trees `old` and `new`.
+
+    :return: `OrderedDict` with a summary and the changes per language.
+    """
+    old_snap = Snapshot.from_tree(old, cache_dir=cache_dir)
+    new_snap = Snapshot.from_tree(new, cache_dir=cache_dir)
+    removed, added, changed = old_snap.compare(new_snap)
+    touched = set(removed) | set(added) | set(changed)
+
+    old_langs = {r['ID']: r for r in old.rows(LANGUAGES) if r['ID'] in touched}
+    new_langs = {r['ID']: r for r in new.rows(LANGUAGES) if r['ID'] in touched}
+    old_forms, new_forms = _forms(old, touched), _forms(new, touched)
+    original_ids = dict(old.original_ids(), **new.original_ids())
+    old_overwrites, new_overwrites = old.blobs(OVERWRITES), new.blobs(OVERWRITES)
+
+    summary = collections.Counter()
+    languages = []
+    for lid in sorted(touched, key=natural_key):
+        status = 'removed' if lid in removed else ('added' if lid in added else 'changed')
+        ofs, nfs = old_forms.get(lid, {}), new_forms.get(lid, {})
+        modified = collections.OrderedDict(
+            (fid, _changes(ofs[fid], nfs[fid]))
+            for fid in sorted(set(ofs) & set(nfs), key=natural_key) if ofs[fid] != nfs[fid])
+        overwrite = '{0}.csv'.format(original_ids.get(lid, lid))
+        entry = collections.OrderedDict([
+            ('ID', lid),
+            ('status', status),
+            ('metadata', _changes(old_langs.get(lid, {}), new_langs.get(lid, {}))
+                if status == 'changed' else None),
+            ('forms_added', sorted(set(nfs) - set(ofs), key=natural_key)),
+            ('forms_removed', sorted(set(ofs) - set(nfs), key=natural_key)),
+            ('forms_modified', modified),
+            ('overwrite', '{0}/{1}'.format(OVERWRITES, overwrite)
+                if overwrite in new_overwrites or overwrite in old_overwrites else None),
+            ('overwrite_changed',
+                old_overwrites.get(overwrite) != new_overwrites.get(overwrite)),
+        ])
+        summary['languages_' + status] += 1
+        summary['forms_added'] += len(entry['forms_added'])
+        summary['forms_removed'] += len(entry['forms_removed'])
+        summary['forms_modified'] += len(modified)
+        languages.append(entry)
+
+    return collections.OrderedDict([
+        ('old', str(old)),
+        ('new', str(new)),
+        ('summary', collections.OrderedDict(sorted(summary.items()))),
+        ('languages', languages),
+    ])
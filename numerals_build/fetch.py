@@ -0,0 +1,235 @@
+"""
+Fetching the files of the upstream channumerals release into `raw/`.
+
+The source of the files is configurable:
+
+- an HTTP(S) base URL, e.g. the `cldf` directory of the channumerals repository on GitHub,
+- a local directory, e.g. a clone or mirror of the release,
+- a release archive (`.zip`, `.tar.gz`, `.tgz` or `.tar`), as local path or URL; files are
+  looked up by name, preferably in a `cldf` directory of the archive.
+
+Files are fetched concurrently by a pool of threads. Unchanged files are skipped: from local
+directories and archives, a file is only copied if its SHA-1 differs from the file in `raw/`;
+over HTTP, requests are conditional on the ETag and Last-Modified recorded for the last download,
+as long as the file in `raw/` still has the recorded checksum. The records are kept in a JSON
+state file.
+"""
+import json
+import shutil
+import tarfile
+import hashlib
+import pathlib
+import zipfile
+import threading
+import collections
+import concurrent.futures
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar.gz', '.tgz', '.tar')
+
+# Outcomes of fetching a file:
+FETCHED = 'fetched'
+UNCHANGED = 'unchanged'
+
+
+def _sha1(fp):
+    h = hashlib.sha1()
+    for chunk in iter(lambda: fp.read(1 << 20), b''):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def sha1(path):
+    with pathlib.Path(path).open('rb') as fp:
+        return _sha1(fp)
+
+
+def _is_url(spec):
+    return str(spec).startswith(('http://', 'https://'))
+
+
+def _is_archive(spec):
+    return str(spec).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _replace(target, write):
+    """
+    Write `target` via a temporary file, so an interrupted fetch doesn't leave a partial file.
+    """
+    tmp = target.parent / '.{0}.part'.format(target.name)
+    try:
+        with tmp.open('wb') as fp:
+            write(fp)
+        tmp.replace(target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class DirectorySource:
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+
+    def __str__(self):
+        return str(self.directory)
+
+    def fetch(self, name, target, state):
+        src = self.directory / name
+        if not src.exists():
+            raise ValueError('{0} not found in {1}'.format(name, self))
+        checksum = sha1(src)
+        if target.exists() and sha1(target) == checksum:
+            return UNCHANGED, dict(sha1=checksum)
+        with src.open('rb') as fp:
+            _replace(target, lambda out: shutil.copyfileobj(fp, out))
+        return FETCHED, dict(sha1=checksum)
+
+
+class ArchiveSource:
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._archive = None
+
+    def __str__(self):
+        return str(self.path)
+
+    def _open(self):
+        if self._archive is None:
+            if self.path.name.lower().endswith('.zip'):
+                self._archive = zipfile.ZipFile(str(self.path))
+                self._members = {n: n for n in self._archive.namelist() if not n.endswith('/')}
+            else:
+                self._archive = tarfile.open(str(self.path))
+                self._members = {m.name: m for m in self._archive.getmembers() if m.isfile()}
+        return self._archive
+
+    def member(self, name):
+        """
+        :return: The name of the archive member for file `name` - the least nested one, \
+        preferring members in a `cldf` directory.
+        """
+        self._open()
+        candidates = [m for m in self._members if pathlib.PurePosixPath(m).name == name]
+        if not candidates:
+            raise ValueError('{0} not found in {1}'.format(name, self))
+        return sorted(candidates, key=lambda m: (
+            'cldf' not in pathlib.PurePosixPath(m).parts[:-1], m.count('/'), m))[0]
+
+    def _read(self, member, read):
+        archive = self._open()
+        if isinstance(archive, zipfile.ZipFile):
+            with archive.open(member) as fp:
+                return read(fp)
+        with archive.extractfile(self._members[member]) as fp:
+            return read(fp)
+
+    def fetch(self, name, target, state):
+        # Archive members are read sequentially, the archive's file object is shared:
+        with self._lock:
+            member = self.member(name)
+            checksum = self._read(member, _sha1)
+            if target.exists() and sha1(target) == checksum:
+                return UNCHANGED, dict(sha1=checksum)
+            _replace(
+                target, lambda out: self._read(member, lambda fp: shutil.copyfileobj(fp, out)))
+        return FETCHED, dict(sha1=checksum)
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+
+class HTTPSource:
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def __str__(self):
+        return self.base_url
+
+    def url(self, name):
+        return '{0}/{1}'.format(self.base_url, name)
+
+    def fetch(self, name, target, state):
+        import requests
+
+        url = self.url(name)
+        headers = {}
+        if state and state.get('url') == url and target.exists() \
+                and sha1(target) == state.get('sha1'):
+            if state.get('etag'):
+                headers['If-None-Match'] = state['etag']
+            if state.get('last_modified'):
+                headers['If-Modified-Since'] = state['last_modified']
+        with requests.get(url, headers=headers, stream=True, timeout=self.timeout) as res:
+            if res.status_code == 304:
+                return UNCHANGED, state
+            res.raise_for_status()
+            h = hashlib.sha1()
+
+            def write(fp):
+                for chunk in res.iter_content(chunk_size=1 << 16):
+                    h.update(chunk)
+                    fp.write(chunk)
+
+            _replace(target, write)
+            return FETCHED, dict(
+                url=url,
+                sha1=h.hexdigest(),
+                etag=res.headers.get('ETag'),
+                last_modified=res.headers.get('Last-Modified'))
+
+
+def get_source(spec, cache_dir=None, state=None):
+    """
+    Create the source for `spec` - a base URL, a directory or an archive.
+
+    Archives given by URL are first fetched - conditionally - to `cache_dir`; their state is
+    recorded in `state` under the key `archive`.
+    """
+    if _is_archive(spec):
+        if _is_url(spec):
+            base, _, name = spec.rpartition('/')
+            cache_dir = pathlib.Path(cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            _, state['archive'] = HTTPSource(base).fetch(
+                name, cache_dir / name, state.get('archive'))
+            return ArchiveSource(cache_dir / name)
+        return ArchiveSource(spec)
+    if _is_url(spec):
+        return HTTPSource(spec)
+    return DirectorySource(spec)
+
+
+def fetch(spec, names, target_dir, state_path, workers=4, cache_dir=None, log=None):
+    """
+    Fetch the files `names` from source `spec` to `target_dir`.
+
+    :return: `OrderedDict` mapping file names to `FETCHED` or `UNCHANGED`.
+    """
+    target_dir, state_path = pathlib.Path(target_dir), pathlib.Path(state_path)
+    state = {}
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding='utf-8'))
+    if state.get('source') != str(spec):
+        state = dict(source=str(spec), files={})
+    source = get_source(spec, cache_dir=cache_dir or state_path.parent, state=state)
+
+    res = collections.OrderedDict()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = collections.OrderedDict(
+                (name, executor.submit(
+                    source.fetch, name, target_dir / name, state['files'].get(name)))
+                for name in names)
+            for name, future in futures.items():
+                res[name], state['files'][name] = future.result()
+                if log:
+                    log.info('{0} {1} from {2}'.format(res[name], name, source))
+    finally:
+        if isinstance(source, ArchiveSource):
+            source.close()
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps(state, indent=1, sort_keys=True), encoding='utf-8')
+    return res
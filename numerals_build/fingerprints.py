@@ -0,0 +1,140 @@
+"""
+Fingerprints of the data tables of each language, to find copied varieties.
+
+While forms are added, `FingerprintIndex` updates - per language -
+
+- the MD5 of the concatenated forms (`raw`),
+- the MD5 of the concatenated slugs of the forms (`slug`),
+- the MD5 of the (Parameter_ID, slug) pairs (`rows`),
+
+and collects the (Parameter_ID, slug) pairs of the table. From these a MinHash signature is
+computed, so that near-duplicate tables - differing in only a few forms - can be found with
+LSH banding instead of comparing all pairs of languages.
+
+The fingerprints are persisted as JSON, so audits can run without a rebuild, and signatures of
+unchanged tables are re-used from the previous build.
+"""
+import json
+import zlib
+import random
+import hashlib
+import pathlib
+import itertools
+import collections
+
+from numerals_build import strings
+
+_PRIME = (1 << 61) - 1
+
+
+class FingerprintIndex:
+    def __init__(self, num_perm=32, bands=8):
+        assert num_perm % bands == 0
+        self.num_perm, self.bands = num_perm, bands
+        rnd = random.Random(num_perm)
+        self._perms = [
+            (rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(num_perm)]
+        # Finished fingerprints: lang_id -> dict(raw=, slug=, rows=, minhash=)
+        self.fingerprints = collections.OrderedDict()
+        # Fingerprints being computed: lang_id -> (md5 raw, md5 slug, md5 rows, set of elements)
+        self._open = collections.OrderedDict()
+        self._previous = {}
+
+    @classmethod
+    def load(cls, path):
+        d = json.loads(pathlib.Path(path).read_text(encoding='utf-8'))
+        res = cls(num_perm=d['num_perm'], bands=d['bands'])
+        res.fingerprints.update(d['fingerprints'])
+        return res
+
+    def save(self, path):
+        self.finish()
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(dict(
+            num_perm=self.num_perm, bands=self.bands, fingerprints=self.fingerprints)),
+            encoding='utf-8')
+
+    def reuse(self, path):
+        """
+        Re-use MinHash signatures from a previously saved index, for tables which did not change.
+        """
+        path = pathlib.Path(path)
+        if path.exists():
+            prev = self.load(path)
+            if (prev.num_perm, prev.bands) == (self.num_perm, self.bands):
+                self._previous = prev.fingerprints
+
+    def add_form(self, lang_id, param_id, form):
+        if lang_id not in self._open:
+            self._open[lang_id] = (hashlib.md5(), hashlib.md5(), hashlib.md5(), set())
+        raw, slugged, rows, elements = self._open[lang_id]
+        s = strings.slug(form)
+        raw.update(form.encode('utf-8'))
+        slugged.update(s.encode('utf-8'))
+        element = '{0}:{1}'.format(param_id, s)
+        rows.update(element.encode('utf-8'))
+        rows.update(b'\n')
+        elements.add(element)
+
+    def minhash(self, elements):
+        hashes = [zlib.crc32(e.encode('utf-8')) for e in elements] or [0]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def finish(self):
+        """
+        Compute the final fingerprints of all tables added so far.
+        """
+        for lang_id, (raw, slugged, rows, elements) in self._open.items():
+            fp = dict(raw=raw.hexdigest(), slug=slugged.hexdigest(), rows=rows.hexdigest())
+            prev = self._previous.get(lang_id)
+            if prev and prev['rows'] == fp['rows']:
+                fp['minhash'] = prev['minhash']
+            else:
+                fp['minhash'] = self.minhash(elements)
+            self.fingerprints[lang_id] = fp
+        self._open = collections.OrderedDict()
+
+    def duplicates(self, kind='raw'):
+        """
+        :param kind: `raw` or `slug`.
+        :return: `list` of sorted lists of language IDs with identical tables, in order of first \
+        occurrence.
+        """
+        self.finish()
+        groups = collections.OrderedDict()
+        for lang_id, fp in self.fingerprints.items():
+            groups.setdefault(fp[kind], []).append(lang_id)
+        return [sorted(v) for v in groups.values() if len(v) > 1]
+
+    def similarity(self, a, b):
+        """
+        Estimated Jaccard similarity of the (Parameter_ID, slug) sets of two tables.
+        """
+        sa, sb = self.fingerprints[a]['minhash'], self.fingerprints[b]['minhash']
+        return sum(x == y for x, y in zip(sa, sb)) / self.num_perm
+
+    def similar(self, threshold=0.8):
+        """
+        Find pairs of near-duplicate tables via LSH banding of the MinHash signatures.
+
+        :return: sorted `list` of triples `(lang_id, lang_id, estimated similarity)` for pairs \
+        which are not exact (slug) duplicates.
+        """
+        self.finish()
+        rows = self.num_perm // self.bands
+        candidates = set()
+        for band in range(self.bands):
+            buckets = collections.defaultdict(list)
+            for lang_id, fp in self.fingerprints.items():
+                buckets[tuple(fp['minhash'][band * rows:(band + 1) * rows])].append(lang_id)
+            for bucket in buckets.values():
+                candidates.update(itertools.combinations(sorted(bucket), 2))
+        res = []
+        for a, b in sorted(candidates):
+            if self.fingerprints[a]['slug'] == self.fingerprints[b]['slug']:
+                continue
+            sim = self.similarity(a, b)
+            if sim >= threshold:
+                res.append((a, b, sim))
+        return res
@@ -0,0 +1,245 @@
+"""
+A local, versioned index of the Glottolog metadata needed to build the dataset.
+
+Enriching the ~5,350 varieties - coordinates, name, ISO code, family and macroarea - and checking
+their Glottocodes only needs a few attributes per languoid, but resolving them against a Glottolog
+clone means reading all of its ~25,000 INI files. `GlottologIndex` stores these attributes in a
+SQLite database keyed by Glottocode, generated once from a Glottolog release (see
+`cldfbench numerals.glottolog_index`) and shipped with the dataset as `etc/glottolog.sqlite`.
+
+The index can stand in for the Glottolog catalog passed to `makecldf`: it provides the parts of
+the `pyglottolog.Glottolog` API used by `pylexibank` - `cached_languoids`, `languoids()` and
+`glottocode_by_iso` - with `IndexedLanguoid` records in place of languoids. Note that the index
+only carries the top-level family of a languoid, not its full lineage.
+
+Since the index is not a cldfbench catalog, the CLDF writer doesn't record it as provenance;
+`GlottologIndex.json_ld` describes the Glottolog release it was generated from instead.
+"""
+import re
+import sqlite3
+import pathlib
+import collections.abc
+
+import attr
+from cldfcatalog.repository import GitRepository
+
+# Version of the on-disk format; bump when the schema changes.
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE languoid (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    level TEXT NOT NULL,
+    category TEXT,
+    iso TEXT,
+    latitude REAL,
+    longitude REAL,
+    family_id TEXT,
+    family TEXT,
+    parent_id TEXT,
+    macroareas TEXT
+);
+CREATE INDEX languoid_iso ON languoid (iso);
+"""
+GLOTTOLOG_URL = 'https://github.com/glottolog/glottolog'
+COLUMNS = [
+    'id', 'name', 'level', 'category', 'iso', 'latitude', 'longitude', 'family_id', 'family',
+    'parent_id', 'macroareas']
+
+
+def version_key(version):
+    """
+    Sort key for `git describe` output of Glottolog clones, e.g. `v4.8` or `v4.8-3-gabcdef0` -
+    or `None` if `version` isn't of this form.
+    """
+    match = re.fullmatch(r'v?(?P<release>[0-9]+(\.[0-9]+)*)(-(?P<ahead>[0-9]+)-g[0-9a-f]+)?',
+                         version or '')
+    if not match:
+        return None
+    return (
+        tuple(int(n) for n in match.group('release').split('.')),
+        int(match.group('ahead') or 0))
+
+
+@attr.s(slots=True, frozen=True)
+class Macroarea:
+    name = attr.ib()
+
+
+@attr.s(slots=True, frozen=True)
+class IndexedLanguoid:
+    """
+    The Glottolog metadata of a languoid, as stored in the index.
+
+    `lineage` and `macroareas` mimic the attributes of `pyglottolog`'s `Languoid`, but the
+    lineage is reduced to the top-level family.
+    """
+    id = attr.ib()
+    name = attr.ib()
+    level = attr.ib()
+    category = attr.ib(default=None)
+    iso = attr.ib(default=None)
+    latitude = attr.ib(default=None)
+    longitude = attr.ib(default=None)
+    family_id = attr.ib(default=None)
+    family = attr.ib(default=None)
+    parent_id = attr.ib(default=None)
+    macroareas = attr.ib(
+        default=(),
+        converter=lambda v: tuple(Macroarea(n) for n in v.split(';')) if isinstance(v, str)
+        else tuple(Macroarea(getattr(m, 'name', m)) for m in v or ()))
+
+    @property
+    def glottocode(self):
+        return self.id
+
+    @property
+    def lineage(self):
+        return [(self.family, self.family_id, 'family')] if self.family_id else []
+
+    @classmethod
+    def from_languoid(cls, lang):
+        """
+        Extract the indexed attributes from a `pyglottolog.languoids.Languoid`.
+        """
+        lineage = lang.lineage or []
+        return cls(
+            id=lang.id,
+            name=lang.name,
+            level=getattr(lang.level, 'name', lang.level),
+            category=lang.category,
+            iso=lang.iso or None,
+            latitude=lang.latitude,
+            longitude=lang.longitude,
+            family_id=lineage[0][1] if lineage else None,
+            family=lineage[0][0] if lineage else None,
+            parent_id=lineage[-1][1] if lineage else None,
+            macroareas=lang.macroareas)
+
+    def astuple(self):
+        return (
+            self.id, self.name, self.level, self.category, self.iso, self.latitude,
+            self.longitude, self.family_id, self.family, self.parent_id,
+            ';'.join(m.name for m in self.macroareas) or None)
+
+
+class GlottologIndex(collections.abc.Mapping):
+    """
+    Read-only mapping of Glottocodes to `IndexedLanguoid`, backed by an SQLite index.
+
+    :raises ValueError: if the index was written in a different format version.
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        if not self.path.exists():
+            raise ValueError('no Glottolog index at {0}'.format(self.path))
+        self._db = sqlite3.connect('file:{0}?mode=ro'.format(self.path.as_posix()), uri=True)
+        self.meta = dict(self._db.execute('SELECT key, value FROM meta'))
+        if self.meta.get('format_version') != str(INDEX_VERSION):
+            raise ValueError('Glottolog index {0} has format version {1}, expected {2}'.format(
+                self.path, self.meta.get('format_version'), INDEX_VERSION))
+        self._cache = {}
+        self._by_iso = None
+
+    @property
+    def version(self):
+        """
+        The Glottolog release the index was generated from.
+        """
+        return self.meta.get('glottolog_version')
+
+    @property
+    def url(self):
+        return self.meta.get('glottolog_url') or GLOTTOLOG_URL
+
+    def json_ld(self):
+        """
+        Provenance of the index - described like the Glottolog catalog it was generated from.
+        """
+        return GitRepository(self.url, title='Glottolog', version=self.version).json_ld()
+
+    @classmethod
+    def build(cls, path, languoids, version=None, url=None):
+        """
+        Write the index for `languoids` - `pyglottolog` languoids or `IndexedLanguoid`s - to
+        `path`, replacing an existing index.
+
+        :param version: The Glottolog release, as returned by `git describe` for a clone.
+        :param url: The URL of the Glottolog repository.
+        """
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.unlink()
+        rows = sorted(
+            (lg if isinstance(lg, IndexedLanguoid) else IndexedLanguoid.from_languoid(lg))
+            .astuple() for lg in languoids)
+        db = sqlite3.connect(str(path))
+        try:
+            with db:
+                db.executescript(SCHEMA)
+                db.executemany('INSERT INTO meta VALUES (?, ?)', [
+                    ('format_version', str(INDEX_VERSION)),
+                    ('glottolog_version', version),
+                    ('glottolog_url', url),
+                    ('languoids', str(len(rows))),
+                ])
+                db.executemany(
+                    'INSERT INTO languoid VALUES ({0})'.format(', '.join('?' * len(COLUMNS))),
+                    rows)
+            db.execute('VACUUM')
+        finally:
+            db.close()
+        return cls(path)
+
+    def close(self):
+        self._db.close()
+
+    def __getitem__(self, glottocode):
+        if glottocode not in self._cache:
+            row = self._db.execute(
+                'SELECT {0} FROM languoid WHERE id = ?'.format(', '.join(COLUMNS)),
+                (glottocode,)).fetchone()
+            if row is None:
+                raise KeyError(glottocode)
+            self._cache[glottocode] = IndexedLanguoid(*row)
+        return self._cache[glottocode]
+
+    def __contains__(self, glottocode):
+        return glottocode in self._cache or self._db.execute(
+            'SELECT 1 FROM languoid WHERE id = ?', (glottocode,)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self._db.execute('SELECT id FROM languoid ORDER BY id'))
+
+    def __len__(self):
+        return self._db.execute('SELECT count(*) FROM languoid').fetchone()[0]
+
+    #
+    # The parts of the `pyglottolog.Glottolog` (and `cldfcatalog.Catalog`) API used by
+    # `pylexibank` when building and describing a dataset:
+    #
+    @property
+    def api(self):
+        return self
+
+    @property
+    def cached_languoids(self):
+        return self
+
+    def languoids(self):
+        for row in self._db.execute(
+                'SELECT {0} FROM languoid ORDER BY id'.format(', '.join(COLUMNS))):
+            yield IndexedLanguoid(*row)
+
+    @property
+    def glottocode_by_iso(self):
+        if self._by_iso is None:
+            self._by_iso = dict(self._db.execute(
+                'SELECT iso, id FROM languoid WHERE iso IS NOT NULL ORDER BY id DESC'))
+        return self._by_iso
+
+    def describe(self):
+        return self.version
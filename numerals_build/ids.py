@@ -0,0 +1,149 @@
+"""
+Language and form IDs.
+
+Language IDs in the CLDF data follow the (possibly updated) Glottocode of a variety, numbered
+`<glottocode>-1`, `<glottocode>-2`, ... in the order the varieties appear in `etc/languages.csv`.
+Form IDs append the Parameter_ID and a counter: `<glottocode>-<variety>-<parameter>-<n>`.
+"""
+import csv
+import pickle
+import pathlib
+import tempfile
+import collections
+
+
+def _sort_int(s):
+    try:
+        return int(s)
+    except ValueError:
+        return s
+
+
+def natural_key(id_):
+    """
+    Sort key for IDs with numeric parts, e.g. `abcd1234-2-10-1` -> `('abcd1234', 2, 10, 1)`.
+    """
+    return tuple(_sort_int(i) for i in id_.split('-'))
+
+
+class FormBuckets:
+    """
+    Forms grouped by language, to emit them in `natural_key` order of their IDs without sorting
+    the whole FormTable.
+
+    Only the language IDs are parsed into sort keys; within a language, forms are ordered by the
+    (Parameter_ID, counter) key computed when they are added. Since data files are mostly ordered
+    already, sorting each bucket is close to linear.
+
+    With `spill_dir`, `flush` moves the buckets to a temporary file in that directory. Iterating
+    then reads back one language at a time, so memory use is bounded by the largest language
+    rather than by the whole table. Instances can be iterated repeatedly.
+    """
+    def __init__(self, spill_dir=None):
+        self._buckets = collections.defaultdict(list)
+        self._count = 0
+        self._spill_dir = spill_dir
+        self._spill = None
+        self._chunks = collections.defaultdict(list)
+
+    def add(self, form):
+        """
+        :param form: `dict` with keys ID, Language_ID and Parameter_ID.
+        """
+        self._buckets[form['Language_ID']].append((
+            (_sort_int(form['Parameter_ID']), _sort_int(form['ID'].rpartition('-')[2])), form))
+        self._count += 1
+
+    def flush(self):
+        """
+        Move the forms added so far to the spill file (a no-op without `spill_dir`).
+        """
+        if self._spill_dir is None:
+            return
+        if self._spill is None:
+            pathlib.Path(self._spill_dir).mkdir(parents=True, exist_ok=True)
+            self._spill = tempfile.TemporaryFile(dir=str(self._spill_dir))
+        self._spill.seek(0, 2)
+        for lang_id, items in self._buckets.items():
+            self._chunks[lang_id].append(self._spill.tell())
+            pickle.dump(items, self._spill, protocol=pickle.HIGHEST_PROTOCOL)
+        self._buckets = collections.defaultdict(list)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for lang_id in sorted(set(self._buckets) | set(self._chunks), key=natural_key):
+            items = list(self._buckets.get(lang_id, []))
+            for offset in self._chunks.get(lang_id, []):
+                self._spill.seek(offset)
+                items.extend(pickle.load(self._spill))
+            for _, form in sorted(items, key=lambda i: i[0]):
+                yield form
+
+
+class LanguageIDMap:
+    """
+    Mapping of language IDs as used in the data files to the renumbered IDs of the CLDF data.
+
+    The new ID for each old ID is computed once, when the language is added, so lookups are
+    constant-time dict accesses.
+    """
+    def __init__(self):
+        self._new_ids = {}
+        self._counts = collections.Counter()
+
+    @classmethod
+    def from_languages(cls, languages, ignored=None):
+        """
+        :param languages: Iterable of `etc/languages.csv` rows (dicts with keys ID, Glottocode).
+        :param ignored: Set of language IDs to leave out of the numbering.
+        """
+        res = cls()
+        for language in languages:
+            lid = language['ID'].strip()
+            if ignored and lid in ignored:
+                continue
+            res.add(lid, language['Glottocode'])
+        return res
+
+    def add(self, lang_id, glottocode=None):
+        """
+        Assign the next number for `glottocode` - or the code part of `lang_id` if no Glottocode
+        is given - to `lang_id`.
+        """
+        if lang_id in self._new_ids:
+            raise ValueError('duplicate language ID {0}'.format(lang_id))
+        gc = glottocode or lang_id.split('-')[0]
+        self._counts[gc] += 1
+        self._new_ids[lang_id] = '{0}-{1}'.format(gc, self._counts[gc])
+        return self._new_ids[lang_id]
+
+    def renumber(self, lang_id):
+        """
+        Return the CLDF language ID for the data file language ID `lang_id`.
+        """
+        return self._new_ids[lang_id]
+
+    __getitem__ = renumber
+
+    def __contains__(self, lang_id):
+        return lang_id in self._new_ids
+
+    def __len__(self):
+        return len(self._new_ids)
+
+    def items(self):
+        return self._new_ids.items()
+
+    def changed(self):
+        """
+        Pairs (old ID, new ID) of all languages whose ID changed.
+        """
+        return [(k, v) for k, v in self._new_ids.items() if k != v]
+
+    def write(self, path):
+        with open(str(path), 'w', encoding='utf-8', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['Original_ID', 'ID'])
+            writer.writerows(self._new_ids.items())
@@ -0,0 +1,125 @@
+"""
+Parsing and validation of the per-language data files read by `Dataset.cmd_makecldf`.
+
+Each file in `etc/csv` or `raw/csv` is handled as a whole by `read_data_file`, which returns a
+compact batch of validated rows plus the findings for that file. Batches can be computed in a
+process pool; `read_data_files` always yields them in input order, so merging them into the
+writer gives the same output as a serial run.
+
+Only parsing and validating the files runs in the pool. Building the lexemes and adding them
+through the CLDF writer stays serial in the calling process, and the string caches of the workers
+(see `numerals_build.strings`) are not shared with it. In a full build parsing takes ~2.3s of
+~13s, so worker processes can save at most that share - and only with more than one CPU: on a
+single CPU they only add the cost of pickling the rows. Reading in-process is the default.
+"""
+import csv
+import sys
+import functools
+import multiprocessing
+
+import attr
+
+from numerals_build import strings
+from numerals_build.problems import ProblemDetector, FORM_LENGTH, OTHER_FORM_BRACKETS
+
+# Number of columns of the data files (see `raw/csv` and `etc/csv`).
+FORM_COLUMNS = 14
+
+
+@attr.s(slots=True)
+class DataFileResult:
+    """
+    Validated rows and findings for one data file.
+
+    `rows` holds one tuple per form, in file order, with the fields
+    (Language_ID, Parameter_ID, Value, Form, Comment, Other_Form, Loan, Variant_ID, Problematic).
+    `lang_ids` holds all Language_IDs found in the file, including ignored and unknown ones.
+    Findings which concern individual rows record the line numbers of these rows: `misaligned`,
+    `form_length` and `other_form` are lists of line numbers, `unknown_params` holds triples
+    (Parameter_ID, Language_ID, line number).
+    """
+    path = attr.ib()
+    lang_ids = attr.ib(default=attr.Factory(set))
+    rows = attr.ib(default=attr.Factory(list))
+    unknown_languages = attr.ib(default=attr.Factory(list))
+    unknown_params = attr.ib(default=attr.Factory(list))
+    misaligned_overwrites = attr.ib(default=attr.Factory(set))
+    misaligned = attr.ib(default=attr.Factory(list))
+    form_length = attr.ib(default=attr.Factory(list))
+    other_form = attr.ib(default=attr.Factory(list))
+
+
+def read_data_file(path, ignored_lang_ids, valid_languages, valid_parameters, missing_data):
+    res = DataFileResult(path)
+    seen_unknown = set()
+    with open(str(path), encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            lang_id = sys.intern(row["Language_ID"].strip())
+            res.lang_ids.add(lang_id)
+
+            if lang_id in ignored_lang_ids:
+                continue
+            if lang_id not in valid_languages:
+                if lang_id not in seen_unknown:
+                    res.unknown_languages.append(lang_id)
+                    seen_unknown.add(lang_id)
+                continue
+
+            param_id = sys.intern(row["Parameter_ID"].strip())
+            if param_id not in valid_parameters:
+                res.unknown_params.append((param_id, lang_id, reader.line_num))
+                continue
+
+            form = strings.nfc(row["Form"].strip())
+
+            if form in missing_data:
+                continue
+
+            if len(row) != FORM_COLUMNS:
+                res.misaligned.append(reader.line_num)
+
+            if row["Loan"] is None or\
+                    row["Variant_ID"] is None or\
+                    len(row["Loan"].strip()) < 3 or\
+                    len(row["Variant_ID"].strip()) < 1:
+                res.misaligned_overwrites.add(lang_id)
+
+            value = strings.nfc(row["Value"].strip())
+
+            reasons = ProblemDetector.row_reasons(form, value, row["Other_Form"])
+            if FORM_LENGTH in reasons:
+                res.form_length.append(reader.line_num)
+            if OTHER_FORM_BRACKETS in reasons:
+                res.other_form.append(reader.line_num)
+
+            res.rows.append((
+                lang_id,
+                param_id,
+                value,
+                form,
+                row["Comment"].strip(),
+                row["Other_Form"].strip(),
+                row["Loan"].strip() == "True",
+                sys.intern(row["Variant_ID"].strip()),
+                row["Problematic"].strip() == "True",
+            ))
+    return res
+
+
+def read_data_files(paths, workers=1, **kw):
+    """
+    Yield a `DataFileResult` for each path in `paths`, in order.
+
+    :param workers: Number of worker processes; with `workers <= 1` files are read in-process.
+    :param kw: Keyword arguments passed to `read_data_file`.
+    """
+    reader = functools.partial(read_data_file, **kw)
+    if not workers or workers <= 1:
+        for path in paths:
+            yield reader(path)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        # imap keeps the input order, chunking amortizes the IPC overhead for the many small files.
+        yield from pool.imap(reader, paths, chunksize=max(1, len(paths) // (workers * 8)))
@@ -0,0 +1,160 @@
+"""
+Stage-level instrumentation of the build commands.
+
+`Instrumentation` accumulates, per named stage, wall time, CPU time, the number of times the
+stage was entered and the number of items processed. Peak RSS is read from the OS after each
+stage - it is the peak of the process (and of finished worker processes) so far, so growth
+between stages shows which stage allocated the memory. Per-language costs are recorded as well,
+to find the slowest and largest varieties.
+"""
+import json
+import time
+import pathlib
+import cProfile
+import contextlib
+import collections
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size in MB of this process and its waited-for children.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    res = 0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        res = max(res, resource.getrusage(who).ru_maxrss)
+    # ru_maxrss is given in kilobytes on Linux:
+    return round(res / 1024, 1)
+
+
+class Stage:
+    __slots__ = ['wall', 'cpu', 'calls', 'items', 'peak_rss_mb']
+
+    def __init__(self):
+        self.wall, self.cpu, self.calls, self.items, self.peak_rss_mb = 0.0, 0.0, 0, 0, None
+
+    def asdict(self):
+        return collections.OrderedDict([
+            ('wall', round(self.wall, 4)),
+            ('cpu', round(self.cpu, 4)),
+            ('calls', self.calls),
+            ('items', self.items),
+            ('peak_rss_mb', self.peak_rss_mb),
+        ])
+
+
+class Instrumentation:
+    """
+    :param profile: Path to write a cProfile dump of the whole run to, or `None`.
+    """
+    def __init__(self, profile=None):
+        self.stages = collections.OrderedDict()
+        self.counters = collections.Counter()
+        self.languages = collections.OrderedDict()
+        self.profile = pathlib.Path(profile) if profile else None
+        self._start = None
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = Stage()
+        return self.stages[name]
+
+    @contextlib.contextmanager
+    def stage(self, name, items=0):
+        """
+        Context manager measuring the enclosed code as (one more call of) stage `name`.
+
+        Stages should not be nested: the time of a nested stage would be counted twice.
+        """
+        stage = self._stage(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall += time.perf_counter() - wall
+            stage.cpu += time.process_time() - cpu
+            stage.calls += 1
+            stage.items += items
+            stage.peak_rss_mb = peak_rss_mb()
+
+    def iterate(self, name, items):
+        """
+        Yield from `items`, measuring the time spent computing each item as stage `name`.
+        """
+        it = iter(items)
+        while True:
+            with self.stage(name, items=1) as stage:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    stage.items -= 1
+                    return
+            yield item
+
+    def timed(self, name, func):
+        """
+        Wrap `func` so that its calls are measured as stage `name`.
+        """
+        def wrapped(*args, **kw):
+            with self.stage(name):
+                return func(*args, **kw)
+        return wrapped
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def language(self, lang_id, wall, rows):
+        """
+        Record the cost of processing (the data file of) a language.
+        """
+        wall_, rows_ = self.languages.get(lang_id, (0.0, 0))
+        self.languages[lang_id] = (wall_ + wall, rows_ + rows)
+
+    @contextlib.contextmanager
+    def run(self, report=None):
+        """
+        Context manager wrapping a whole command, optionally profiled, writing the report to
+        `report` when done.
+        """
+        profiler = cProfile.Profile() if self.profile else None
+        self._start = (time.perf_counter(), time.process_time())
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile.parent.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(self.profile))
+            if report:
+                self.write(report)
+
+    def report(self, top=20):
+        res = collections.OrderedDict()
+        if self._start:
+            res['total'] = collections.OrderedDict([
+                ('wall', round(time.perf_counter() - self._start[0], 4)),
+                ('cpu', round(time.process_time() - self._start[1], 4)),
+                ('peak_rss_mb', peak_rss_mb()),
+            ])
+        res['stages'] = collections.OrderedDict((k, v.asdict()) for k, v in self.stages.items())
+        res['counters'] = collections.OrderedDict(sorted(self.counters.items()))
+        langs = [
+            collections.OrderedDict([('ID', k), ('wall', round(v[0], 6)), ('rows', v[1])])
+            for k, v in self.languages.items()]
+        res['slowest_languages'] = sorted(langs, key=lambda d: -d['wall'])[:top]
+        res['largest_languages'] = sorted(langs, key=lambda d: -d['rows'])[:top]
+        res['languages'] = langs
+        return res
+
+    def write(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=1), encoding='utf-8')
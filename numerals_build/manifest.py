@@ -0,0 +1,190 @@
+"""
+Change detection and parse cache for runs of `Dataset.cmd_makecldf` with `--reuse-parsed`.
+
+This is not an incremental build: the CLDF data is always written in full, and the forms of all
+languages are added through the CLDF writer on each run. What the manifest saves is reading,
+parsing and validating the per-language data files which didn't change.
+
+The manifest records a content hash for each input file and caches the `DataFileResult` of each
+per-language data file. A cached result is reused as long as
+
+- the content hash of the data file is unchanged,
+- the validation context (valid parameters, missing data markers) is unchanged, and
+- each Language_ID in the file is still ignored/valid exactly as it was when the result was
+  computed.
+
+Only the remaining files are re-parsed and re-validated. Changes of other inputs - e.g.
+`etc/languages.csv` - are only reported (see `BuildManifest.changed_inputs`); their effect on the
+cached results is covered by the last condition above.
+"""
+import json
+import hashlib
+import pathlib
+
+from numerals_build.ingest import DataFileResult, read_data_files, FORM_COLUMNS
+
+MANIFEST_VERSION = 2
+
+
+def file_hash(path):
+    return hashlib.sha1(pathlib.Path(path).read_bytes()).hexdigest()
+
+
+def _result_to_json(res):
+    return dict(
+        lang_ids=sorted(res.lang_ids),
+        rows=res.rows,
+        unknown_languages=res.unknown_languages,
+        unknown_params=res.unknown_params,
+        misaligned_overwrites=sorted(res.misaligned_overwrites),
+        misaligned=res.misaligned,
+        form_length=res.form_length,
+        other_form=res.other_form,
+    )
+
+
+def _result_from_json(path, d):
+    return DataFileResult(
+        path,
+        lang_ids=set(d['lang_ids']),
+        rows=[tuple(r) for r in d['rows']],
+        unknown_languages=d['unknown_languages'],
+        unknown_params=[tuple(p) for p in d['unknown_params']],
+        misaligned_overwrites=set(d['misaligned_overwrites']),
+        misaligned=d['misaligned'],
+        form_length=d['form_length'],
+        other_form=d['other_form'],
+    )
+
+
+class BuildManifest:
+    """
+    Content-hash manifest and row cache, stored in `directory`:
+
+    - `manifest.json`: version, validation context and per-file hash records,
+    - `rows/<name>.json`: the cached `DataFileResult` for data file `<name>.csv`.
+
+    :param index: `numerals_build.datafiles.DataFileIndex` to read mtime and size of the data \
+    files from.
+    """
+    def __init__(self, directory, index=None):
+        self.dir = pathlib.Path(directory)
+        self.index = index
+        self.path = self.dir / 'manifest.json'
+        self.rows_dir = self.dir / 'rows'
+        self.context = None
+        self.files = {}
+        self.inputs = {}
+        if self.path.exists():
+            d = json.loads(self.path.read_text(encoding='utf-8'))
+            if d.get('version') == MANIFEST_VERSION:
+                self.context = d['context']
+                self.files = d['files']
+                self.inputs = d['inputs']
+        self.stats = dict(cached=0, parsed=0)
+
+    def _key(self, path):
+        # Overwrites in etc/csv and raw data files share their file name.
+        return '{0}/{1}'.format(path.parent.parent.name, path.name)
+
+    def _cache_path(self, key):
+        return self.rows_dir / '{0}.json'.format(key.replace('/', '-'))
+
+    def _stat(self, path):
+        if self.index is not None:
+            return list(self.index.stat(path))
+        st = path.stat()
+        return [st.st_mtime_ns, st.st_size]
+
+    def _hash(self, path, record):
+        """
+        Return the content hash of `path`, skipping the read if mtime and size are unchanged.
+        """
+        stat = self._stat(path)
+        if record and record['stat'] == stat:
+            return record['hash']
+        return file_hash(path)
+
+    def changed_inputs(self, paths):
+        """
+        Update the hashes of additional input files (e.g. `etc/languages.csv` or the xlsx
+        workbooks) and return the paths which changed since the last build - for reporting only,
+        cached results are not invalidated by these.
+        """
+        res, inputs = [], {}
+        for p in paths:
+            p = pathlib.Path(p)
+            key = str(p)
+            record = self.inputs.get(key)
+            h = self._hash(p, record)
+            if not record or record['hash'] != h:
+                res.append(p)
+            inputs[key] = dict(hash=h, stat=self._stat(p))
+        self.inputs = inputs
+        return res
+
+    def _valid(self, record, h, ignored_lang_ids, valid_languages):
+        if not record or record['hash'] != h:
+            return False
+        lang_ids = record['lang_ids']
+        return [lid for lid in lang_ids if lid in ignored_lang_ids] == record['ignored'] \
+            and [lid for lid in lang_ids if lid in valid_languages] == record['valid']
+
+    def read_data_files(self, paths, workers=1, **kw):
+        """
+        Drop-in replacement for `numerals_build.ingest.read_data_files`, reusing cached results.
+        """
+        context = dict(
+            valid_parameters=sorted(kw['valid_parameters']),
+            missing_data=list(kw['missing_data']),
+            columns=FORM_COLUMNS,
+        )
+        if context != self.context:
+            self.files = {}
+        self.context = context
+
+        cached, todo, hashes = set(), [], {}
+        for path in paths:
+            key = self._key(path)
+            record = self.files.get(key)
+            hashes[key] = self._hash(path, record)
+            if self._valid(record, hashes[key], kw['ignored_lang_ids'], kw['valid_languages']) \
+                    and self._cache_path(key).exists():
+                cached.add(key)
+            else:
+                todo.append(path)
+
+        self.files = {self._key(path): self.files[self._key(path)]
+                      for path in paths if self._key(path) in self.files}
+        self.rows_dir.mkdir(parents=True, exist_ok=True)
+        # Results are yielded lazily, in order, so only one file's rows are held at a time:
+        parsed = read_data_files(todo, workers=workers, **kw) if todo else iter([])
+        for path in paths:
+            key = self._key(path)
+            if key in cached:
+                self.stats['cached'] += 1
+                yield _result_from_json(
+                    path, json.loads(self._cache_path(key).read_text(encoding='utf-8')))
+                continue
+
+            res = next(parsed)
+            self.files[key] = dict(
+                hash=hashes[key],
+                stat=self._stat(res.path),
+                lang_ids=sorted(res.lang_ids),
+                ignored=[lid for lid in sorted(res.lang_ids) if lid in kw['ignored_lang_ids']],
+                valid=[lid for lid in sorted(res.lang_ids) if lid in kw['valid_languages']],
+            )
+            self._cache_path(key).write_text(
+                json.dumps(_result_to_json(res), ensure_ascii=False), encoding='utf-8')
+            self.stats['parsed'] += 1
+            yield res
+
+    def save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(dict(
+            version=MANIFEST_VERSION,
+            context=self.context,
+            files=self.files,
+            inputs=self.inputs,
+        ), indent=1), encoding='utf-8')
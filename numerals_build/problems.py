@@ -0,0 +1,141 @@
+"""
+Detection of problematic forms.
+
+`ProblemDetector` compiles the checks of `pynumerals.errorcheck` into two merged regular
+expressions - one over the form, one over its lowercased version - plus set and prefix lookups.
+The combined scan decides whether a form is problematic. Only forms flagged by it - a small
+minority - are run through the individual checks again, to report exactly which checks failed.
+
+`pynumerals` is only imported - and the shared `DETECTOR` only compiled - on first use, since
+importing `pynumerals` pulls in its HTML processing dependencies.
+"""
+import re
+
+# Reasons reported in addition to the names of the pynumerals checks:
+OTHER_FORM_LOANWORD = 'other_form_loanword'
+FORM_LENGTH = 'form_length'
+OTHER_FORM_BRACKETS = 'other_form_brackets'
+
+
+def reason(check):
+    """
+    The reason code for a check function, e.g. "has_gloss" for `error_has_gloss`.
+    """
+    return check.__name__[len('error_'):] if check.__name__.startswith('error_') \
+        else check.__name__
+
+
+class ProblemDetector:
+    """
+    :param checks: List of check functions, each returning `True` for a problematic form.
+
+    Checks of `pynumerals.errorcheck` which are not known to the compiler are run one by one.
+    """
+    def __init__(self, checks=None):
+        from pynumerals import errorcheck
+
+        self.checks = list(errorcheck.errorchecks if checks is None else checks)
+        known = {
+            errorcheck.error_fullstop,
+            errorcheck.error_has_numeric,
+            errorcheck.error_has_abbr,
+            errorcheck.error_has_gloss,
+            errorcheck.error_loanword,
+            errorcheck.error_has_parenthesis,
+            errorcheck.error_has_blacklist_item,
+            errorcheck.error_is_numeric,
+        }
+        self.uncompiled = [c for c in self.checks if c not in known]
+
+        cs, lc = [], []
+        # The pynumerals checks use re.match with a leading ".*", i.e. they only look at the
+        # first line of the form.
+        firstline = []
+        if errorcheck.error_fullstop in self.checks:
+            firstline.append(r'\d\.')
+        if errorcheck.error_has_numeric in self.checks:
+            firstline.append(r'[ (]\d')
+        if errorcheck.error_has_abbr in self.checks:
+            firstline.append(r'\b.\. ')
+        if errorcheck.error_has_gloss in self.checks:
+            firstline.append(r'\-[A-Z]{2,}')
+        if firstline:
+            cs.append(r'\A[^\n]*?(?:{0})'.format('|'.join(firstline)))
+        if errorcheck.error_loanword in self.checks:
+            cs.append('<')
+
+        self.exact, self.prefixes = frozenset(), ()
+        if errorcheck.error_has_blacklist_item in self.checks:
+            cs.extend(re.escape(b) for b in errorcheck._blacklistCS)
+            lc.extend(re.escape(b) for b in errorcheck._blacklist)
+            self.exact = frozenset(errorcheck._blacklistIS)
+            self.prefixes = tuple(errorcheck._blacklistSW)
+        self.numeric = errorcheck.error_is_numeric \
+            if errorcheck.error_is_numeric in self.checks else None
+        self.parenthesis = errorcheck.error_has_parenthesis in self.checks
+
+        self._cs = re.compile('|'.join(cs)) if cs else None
+        self._lc = re.compile('|'.join(lc)) if lc else None
+
+    def _hit(self, value):
+        """
+        Single combined scan: `True` iff any of the checks fails.
+        """
+        if self._cs and self._cs.search(value):
+            return True
+        if self._lc and self._lc.search(value.lower()):
+            return True
+        if value in self.exact or (self.prefixes and value.startswith(self.prefixes)):
+            return True
+        if self.parenthesis and (('(' in value) != (')' in value)):
+            return True
+        if self.numeric and self.numeric(value):
+            return True
+        return any(check(value) for check in self.uncompiled)
+
+    def reasons(self, form, other_form=None):
+        """
+        :return: tuple of reason codes for the problems found in `form` and `other_form`.
+        """
+        res = ()
+        if self._hit(form):
+            res = tuple(reason(check) for check in self.checks if check(form))
+        if other_form and '<' in other_form:
+            res += (OTHER_FORM_LOANWORD,)
+        return res
+
+    def is_problematic(self, form, other_form=None):
+        return self._hit(form) or bool(other_form and '<' in other_form)
+
+    def batch(self, forms):
+        """
+        Compute the reasons for all forms of a language at once.
+
+        :param forms: iterable of `(form, other_form)` pairs.
+        :return: `list` of reason tuples, in the order of `forms`.
+        """
+        cache, res = {}, []
+        for item in forms:
+            if item not in cache:
+                cache[item] = self.reasons(*item)
+            res.append(cache[item])
+        return res
+
+    @staticmethod
+    def row_reasons(form, value, other_form):
+        """
+        Checks of a data file row, as done in `Dataset.cmd_makecldf`.
+        """
+        res = ()
+        if len(form) > len(value) + 1 or "[" in form or "]" in form:
+            res += (FORM_LENGTH,)
+        if other_form is not None and ("[" in other_form or "]" in other_form):
+            res += (OTHER_FORM_BRACKETS,)
+        return res
+
+
+def __getattr__(name):
+    if name == 'DETECTOR':
+        globals()['DETECTOR'] = ProblemDetector()
+        return globals()['DETECTOR']
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
@@ -0,0 +1,87 @@
+"""
+Compact representation of the forms of the FormTable during the build.
+
+The writer's `add_form` returns one dict per form; keeping ~190,000 of these dicts alive until
+the FormTable is written dominates the memory footprint of `makecldf`. `FormRow` stores the same
+data in slots, and shares the values repeated across rows - the IDs of languages, parameters and
+variants, and the `Source` and `Segments` lists - between all rows.
+
+`FormRow` implements the read-only `Mapping` protocol (plus item assignment), so rows can be
+passed to the CLDF writer in place of dicts.
+"""
+import sys
+import collections.abc
+
+# The columns of the FormTable, i.e. the fields of `lexibank_numerals.CustomLexeme`:
+COLUMNS = (
+    'ID',
+    'Form',
+    'Value',
+    'Language_ID',
+    'Parameter_ID',
+    'Local_ID',
+    'Segments',
+    'Graphemes',
+    'Profile',
+    'Source',
+    'Comment',
+    'Cognacy',
+    'Loan',
+    'Problematic',
+    'Other_Form',
+    'Variant_ID',
+)
+_COLUMNS = frozenset(COLUMNS)
+_SHARED = frozenset(['Language_ID', 'Parameter_ID', 'Variant_ID', 'Source', 'Segments'])
+_shared = {}
+
+
+def intern_value(v):
+    """
+    Return a shared instance of `v` - for strings and lists of strings (as tuples).
+    """
+    if isinstance(v, str):
+        return sys.intern(v)
+    if isinstance(v, (list, tuple)):
+        v = tuple(v)
+        return _shared.setdefault(v, v)
+    return v
+
+
+class FormRow(collections.abc.Mapping):
+    __slots__ = COLUMNS
+
+    def __init__(self, *values):
+        for col, v in zip(COLUMNS, values):
+            if col in _SHARED:
+                v = intern_value(v)
+            setattr(self, col, v)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(*[d.get(col) for col in COLUMNS])
+
+    def __reduce__(self):
+        return (self.__class__, tuple(getattr(self, col) for col in COLUMNS))
+
+    def __getitem__(self, key):
+        if key not in _COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _COLUMNS else default
+
+    def __setitem__(self, key, value):
+        if key not in _COLUMNS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    def __repr__(self):
+        return '<FormRow {0}>'.format(self.ID)
@@ -0,0 +1,311 @@
+"""
+Search over the forms of the built CLDF data.
+
+`SearchIndex` is a character n-gram inverted index over the `Form`, `Value`, `Other_Form` and
+`Comment` of all forms, stored in SQLite (by default in `.build/search.sqlite`). Each non-empty
+field of a form is a document; the posting list of an n-gram - the sorted IDs of the documents
+containing it - is stored as one packed array. Documents are indexed with the n-grams of their
+lowercased text and of its slug, padded at both ends, so queries can match
+
+- substrings: documents containing all n-grams of the query are candidates,
+- slugs: the same, for the slug of the query,
+- fuzzily: documents sharing enough n-grams with the query to possibly be within the maximal
+  edit distance are candidates (see Ukkonen's q-gram lemma),
+
+and candidates are then checked against the query. Queries shorter than the n-gram size are
+answered by scanning all documents.
+
+The index is updated incrementally: it records the per-language digests of
+`numerals_build.diff.Snapshot`, and only the documents of languages added, removed or changed
+since the last update are re-indexed.
+"""
+import array
+import sqlite3
+import pathlib
+import collections
+
+from numerals_build import strings
+from numerals_build.ids import natural_key
+from numerals_build.diff import Snapshot, FORMS, LANGUAGES
+
+# Version of the on-disk format; an index in another format is rebuilt.
+INDEX_VERSION = 1
+N = 3
+FIELDS = ['Form', 'Value', 'Other_Form', 'Comment']
+BEGIN, END = '\x02', '\x03'
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE language (id TEXT PRIMARY KEY, family TEXT, digest TEXT);
+CREATE TABLE doc (
+    id INTEGER PRIMARY KEY,
+    form_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    parameter TEXT NOT NULL,
+    field TEXT NOT NULL,
+    text TEXT NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE INDEX doc_language ON doc (language);
+CREATE TABLE gram (gram TEXT PRIMARY KEY, docs BLOB NOT NULL) WITHOUT ROWID;
+"""
+DOC_COLUMNS = 'id, form_id, language, parameter, field, text, norm'
+
+Hit = collections.namedtuple(
+    'Hit', ['form_id', 'language', 'parameter', 'field', 'text', 'distance'])
+
+
+def grams(s, n=N, pad=True):
+    """
+    The set of n-grams of `s` - padded with begin and end markers if `pad`.
+    """
+    if pad:
+        s = BEGIN + s + END
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+def levenshtein(a, b, cutoff=None):
+    """
+    The edit distance of `a` and `b` - or `None` if it exceeds `cutoff`.
+    """
+    if cutoff is not None and abs(len(a) - len(b)) > cutoff:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if cutoff is not None and min(current) > cutoff:
+            return None
+        previous = current
+    d = previous[-1]
+    return None if cutoff is not None and d > cutoff else d
+
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _keys(text, norm):
+    return grams(text.lower()) | grams(norm)
+
+
+class SearchIndex:
+    """
+    :param path: Path of the SQLite database; it is created if it doesn't exist.
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        version = None
+        if self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+            version = dict(self._db.execute('SELECT key, value FROM meta')).get('format_version')
+        if version != str(INDEX_VERSION):
+            self._create()
+        self._families = None
+
+    def _create(self):
+        with self._db:
+            for (name,) in self._db.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                self._db.execute('DROP TABLE {0}'.format(name))
+            self._db.executescript(SCHEMA)
+            self._db.execute(
+                'INSERT INTO meta VALUES (?, ?)', ('format_version', str(INDEX_VERSION)))
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT count(*) FROM doc').fetchone()[0]
+
+    def update(self, tree, cache_dir=None):
+        """
+        Update the index with the CLDF data of `tree` - a `numerals_build.diff.Tree`.
+
+        :return: triple (IDs of languages added, removed, changed).
+        """
+        snapshot = Snapshot.from_tree(tree, cache_dir=cache_dir)
+        digests = {
+            lid: '{0}-{1}'.format(meta, forms)
+            for lid, (meta, forms, _) in snapshot.languages.items()}
+        indexed = dict(self._db.execute('SELECT id, digest FROM language'))
+        added = sorted(set(digests) - set(indexed), key=natural_key)
+        removed = sorted(set(indexed) - set(digests), key=natural_key)
+        changed = sorted(
+            (lid for lid in set(digests) & set(indexed) if digests[lid] != indexed[lid]),
+            key=natural_key)
+        stale, fresh = set(removed) | set(changed), set(added) | set(changed)
+        if not (stale or fresh):
+            return added, removed, changed
+
+        # Postings to remove and to add, per n-gram:
+        removals, additions = collections.defaultdict(set), collections.defaultdict(list)
+        for chunk in _chunks(stale):
+            for doc, text, norm in self._db.execute(
+                    'SELECT id, text, norm FROM doc WHERE language IN ({0})'.format(
+                        ','.join('?' * len(chunk))), chunk):
+                for g in _keys(text, norm):
+                    removals[g].add(doc)
+
+        families = {r['ID']: r.get('Family') or None for r in tree.rows(LANGUAGES)}
+        next_id = (self._db.execute('SELECT max(id) FROM doc').fetchone()[0] or 0) + 1
+        docs = []
+        for row in tree.rows(FORMS):
+            if row['Language_ID'] not in fresh:
+                continue
+            for field in FIELDS:
+                text = row.get(field) or ''
+                if not text or (field == 'Value' and text == row.get('Form')):
+                    continue
+                text = strings.nfc(text)
+                norm = strings.slug(text)
+                docs.append((
+                    next_id, row['ID'], row['Language_ID'], row['Parameter_ID'], field, text,
+                    norm))
+                for g in _keys(text, norm):
+                    additions[g].append(next_id)
+                next_id += 1
+
+        with self._db:
+            for chunk in _chunks(stale):
+                marks = ','.join('?' * len(chunk))
+                self._db.execute('DELETE FROM doc WHERE language IN ({0})'.format(marks), chunk)
+                self._db.execute('DELETE FROM language WHERE id IN ({0})'.format(marks), chunk)
+            self._db.executemany(
+                'INSERT INTO doc ({0}) VALUES (?, ?, ?, ?, ?, ?, ?)'.format(DOC_COLUMNS), docs)
+            self._db.executemany('INSERT INTO language VALUES (?, ?, ?)', [
+                (lid, families.get(lid), digests[lid]) for lid in sorted(fresh)])
+
+            keys = set(removals) | set(additions)
+            postings = {}
+            for chunk in _chunks(keys):
+                postings.update(self._db.execute(
+                    'SELECT gram, docs FROM gram WHERE gram IN ({0})'.format(
+                        ','.join('?' * len(chunk))), chunk))
+            updates, deletions = [], []
+            for g in keys:
+                docs = array.array('I')
+                if g in postings:
+                    docs.frombytes(postings[g])
+                    if g in removals:
+                        docs = array.array('I', (d for d in docs if d not in removals[g]))
+                # New documents have the largest IDs, so the list stays sorted:
+                docs.extend(additions.get(g, ()))
+                if docs:
+                    updates.append((g, docs.tobytes()))
+                else:
+                    deletions.append((g,))
+            self._db.executemany('INSERT OR REPLACE INTO gram VALUES (?, ?)', updates)
+            self._db.executemany('DELETE FROM gram WHERE gram = ?', deletions)
+        self._families = None
+        return added, removed, changed
+
+    def _postings(self, gram):
+        row = self._db.execute('SELECT docs FROM gram WHERE gram = ?', (gram,)).fetchone()
+        res = array.array('I')
+        if row:
+            res.frombytes(row[0])
+        return res
+
+    def _docs(self, ids=None, column='text', lengths=None):
+        """
+        Iterate the documents with IDs `ids` - or all documents, optionally only those with
+        `column` of length `lengths[0]` to `lengths[1]`.
+        """
+        if ids is None:
+            if lengths:
+                yield from self._db.execute(
+                    'SELECT {0} FROM doc WHERE length({1}) BETWEEN ? AND ? ORDER BY id'.format(
+                        DOC_COLUMNS, column), lengths)
+            else:
+                yield from self._db.execute(
+                    'SELECT {0} FROM doc ORDER BY id'.format(DOC_COLUMNS))
+            return
+        for chunk in _chunks(sorted(ids)):
+            yield from self._db.execute('SELECT {0} FROM doc WHERE id IN ({1})'.format(
+                DOC_COLUMNS, ','.join('?' * len(chunk))), chunk)
+
+    def _candidates(self, query, fuzzy):
+        """
+        :return: set of IDs of candidate documents - or `None` if all documents are candidates.
+        """
+        if fuzzy:
+            keys = grams(query)
+            # Each edit destroys at most N of the n-grams of the query:
+            needed = len(keys) - N * fuzzy
+            if needed <= 0:
+                return None
+            counts = collections.Counter()
+            for g in keys:
+                counts.update(self._postings(g))
+            return {d for d, n in counts.items() if n >= needed}
+        keys = grams(query, pad=False)
+        if not keys:
+            # Shorter than an n-gram, the query is part of the padded n-grams of its matches:
+            res = set()
+            for (posting,) in self._db.execute(
+                    'SELECT docs FROM gram WHERE instr(gram, ?) > 0', (query,)):
+                res.update(array.array('I', posting))
+            return res
+        res = None
+        for posting in sorted((self._postings(g) for g in keys), key=len):
+            res = set(posting) if res is None else res.intersection(posting)
+            if not res:
+                break
+        return res
+
+    def families(self):
+        if self._families is None:
+            self._families = dict(self._db.execute('SELECT id, family FROM language'))
+        return self._families
+
+    def search(
+            self, query, normalize=False, fuzzy=None, parameters=None, families=None, limit=None):
+        """
+        Search the documents matching `query`.
+
+        :param normalize: Match the slug of the query against the slugs of the documents.
+        :param fuzzy: Maximal edit distance of matching documents from the query - or `None` to \
+        match documents containing the query.
+        :param parameters: Only search forms of these parameters.
+        :param families: Only search forms of languages of these families.
+        :return: `list` of `Hit`s, sorted by edit distance and form ID.
+        """
+        query = strings.slug(query) if normalize else strings.nfc(query).lower()
+        if not query:
+            return []
+        parameters = set(parameters) if parameters else None
+        family_of = self.families() if families else None
+        families = set(families or ())
+
+        res = []
+        candidates = self._candidates(query, fuzzy)
+        if candidates is not None and not candidates:
+            return res
+        docs = self._docs(
+            candidates,
+            column='norm' if normalize else 'text',
+            lengths=(max(0, len(query) - fuzzy), len(query) + fuzzy) if fuzzy else None)
+        for _, form_id, lid, pid, field, text, norm in docs:
+            if parameters is not None and pid not in parameters:
+                continue
+            if family_of is not None and family_of.get(lid) not in families:
+                continue
+            target = norm if normalize else text.lower()
+            if fuzzy:
+                distance = levenshtein(query, target, cutoff=fuzzy)
+                if distance is None:
+                    continue
+            elif query in target:
+                distance = 0
+            else:
+                continue
+            res.append(Hit(form_id, lid, pid, field, text, distance))
+        res.sort(key=lambda h: (h.distance, natural_key(h.form_id), FIELDS.index(h.field)))
+        return res[:limit] if limit else res
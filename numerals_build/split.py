@@ -0,0 +1,83 @@
+"""
+Writing the per-language CSV files in `raw/csv` and the `raw/index.md` overview, as done when
+splitting the upstream channumerals data in `Dataset.cmd_download`.
+"""
+import io
+import csv
+import pathlib
+import collections
+
+
+class SplitWriter:
+    """
+    Buffered writer for per-language CSV files and the lines of `index.md`.
+
+    Each CSV file is rendered in memory and written with a single call; index lines are collected
+    and flushed in batches of `batch_size` lines, so `index.md` is opened only a few times instead
+    of once per language. Use as context manager to make sure the last batch gets written.
+    """
+    def __init__(self, csv_dir, index, batch_size=1000):
+        self.csv_dir = pathlib.Path(csv_dir)
+        self.index = pathlib.Path(index)
+        self.batch_size = batch_size
+        self._lines = []
+        self.csv_dir.mkdir(parents=True, exist_ok=True)
+        # The index is always created from scratch:
+        self.index.write_text('', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def write_csv(self, name, header, rows):
+        """
+        Write `rows` (dicts) to `<csv_dir>/<name>` and return the path of the file.
+        """
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, header)
+        writer.writeheader()
+        writer.writerows(rows)
+        path = self.csv_dir / name
+        with open(str(path), 'w', encoding='utf-8', newline='') as fp:
+            fp.write(buf.getvalue())
+        return path
+
+    def add_index_line(self, line):
+        self._lines.append(line + '\n')
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            with open(str(self.index), 'a', encoding='utf-8') as fp:
+                fp.write(''.join(self._lines))
+            self._lines = []
+
+
+def group_rows(rows, key='Language_ID', window=8):
+    """
+    Group a stream of rows (dicts) by the value of `key`, yielding each group as list once it is
+    complete.
+
+    Rows are expected to come grouped already - as in the upstream forms.csv, which is sorted by
+    ID - but up to `window` groups are buffered, so some interleaving is tolerated. Memory use is
+    thus bounded by the size of `window` groups rather than by the size of the stream.
+
+    :raises ValueError: if a row belongs to a group which has already been yielded.
+    """
+    groups, done = collections.OrderedDict(), set()
+    for row in rows:
+        k = row[key]
+        if k not in groups:
+            if k in done:
+                raise ValueError('rows for {0}={1} are not contiguous'.format(key, k))
+            if len(groups) >= window:
+                k_, group = groups.popitem(last=False)
+                done.add(k_)
+                yield group
+            groups[k] = []
+        groups[k].append(row)
+    for group in groups.values():
+        yield group
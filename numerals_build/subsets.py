@@ -0,0 +1,160 @@
+"""
+Export subsets of the built CLDF data - the languages and forms of selected families or
+macroareas - for curation.
+
+All subsets are written in one streaming pass: `languages.csv` is read once to assign languages
+to subsets, then `forms.csv` is read row by row, with each row written to the forms files of all
+subsets containing its language.
+
+The files are formatted as R's `write.csv` would - a leading column of row numbers, all values
+but numbers quoted, empty values as `NA` - as they used to be produced by an R script. Languages
+get curator columns: `Base` and `Comment` are renamed to `Base.Chan` and `Comment.Chan`, and
+followed by empty `Base.<curator>` and `Comment.<curator>` columns.
+"""
+import csv
+import json
+import pathlib
+import contextlib
+
+import attr
+from clldutils.misc import slug
+
+NUMERIC = {'decimal', 'integer', 'float', 'double', 'number'}
+NA = 'NA'
+ORIGINAL_CURATOR = 'Chan'
+CURATED_COLUMNS = ['Base', 'Comment']
+
+
+@attr.s
+class Subset:
+    """
+    The languages for which `column` - e.g. "Family" or "Macroarea" - has value `name`.
+    """
+    column = attr.ib()
+    name = attr.ib()
+    curator = attr.ib(default='Curator')
+
+    @property
+    def stem(self):
+        return slug(self.name)
+
+    @classmethod
+    def from_spec(cls, column, spec, curator='Curator'):
+        """
+        Parse a subset specification `NAME[:CURATOR]`.
+        """
+        name, _, cur = spec.partition(':')
+        return cls(column, name.strip(), cur.strip() or curator)
+
+
+def _table(cldf_dir, url):
+    """
+    :return: pair (path of the table file, set of names of numeric columns).
+    """
+    md = json.loads((cldf_dir / 'cldf-metadata.json').read_text(encoding='utf-8'))
+    for table in md['tables']:
+        if table['url'] == url:
+            numeric = set()
+            for col in table['tableSchema']['columns']:
+                dt = col.get('datatype', 'string')
+                if (dt.get('base') if isinstance(dt, dict) else dt) in NUMERIC:
+                    numeric.add(col['name'])
+            return cldf_dir / url, numeric
+    raise ValueError('no table {0} in {1}'.format(url, cldf_dir))
+
+
+def _quote(v):
+    return '"{0}"'.format(v.replace('"', '""'))
+
+
+class _RWriter:
+    """
+    Writes rows formatted like R's `write.csv`.
+    """
+    def __init__(self, fp, header, numeric=()):
+        self.fp, self.header, self.numeric = fp, header, set(numeric)
+        self.rows = 0
+        self.fp.write(','.join(_quote(h) for h in [''] + header) + '\n')
+
+    def _value(self, col, v):
+        if v is None or v == NA:
+            return NA
+        if col in self.numeric:
+            # R writes numbers with up to 15 significant digits:
+            return '{0:.15g}'.format(float(v))
+        return _quote(v)
+
+    def writerow(self, row):
+        self.rows += 1
+        self.fp.write(','.join(
+            [_quote(str(self.rows))] + [self._value(col, row.get(col)) for col in self.header]
+        ) + '\n')
+
+
+def _na(row):
+    return {k: (NA if v in (None, '') else v) for k, v in row.items()}
+
+
+def _curated(column, curator):
+    return '{0}.{1}'.format(column, curator)
+
+
+def export(cldf_dir, out_dir, subsets, forms=True):
+    """
+    Write `<stem>.languages.csv` and - with `forms=True` - `<stem>.forms.csv` for all `subsets`
+    to `out_dir`.
+
+    :return: `dict` mapping subset stems to pairs (number of languages, number of forms).
+    """
+    cldf_dir, out_dir = pathlib.Path(cldf_dir), pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    lpath, lnumeric = _table(cldf_dir, 'languages.csv')
+    members, counts = {}, {s.stem: [0, 0] for s in subsets}
+
+    with lpath.open(encoding='utf-8') as fp:
+        reader = csv.DictReader(fp)
+        columns = reader.fieldnames
+        with contextlib.ExitStack() as stack:
+            writers = {}
+            for s in subsets:
+                header = []
+                for col in columns:
+                    if col in CURATED_COLUMNS:
+                        header.extend([
+                            _curated(col, ORIGINAL_CURATOR), _curated(col, s.curator)])
+                    else:
+                        header.append(col)
+                writers[s.stem] = _RWriter(
+                    stack.enter_context((out_dir / '{0}.languages.csv'.format(s.stem)).open(
+                        'w', encoding='utf-8', newline='')),
+                    header,
+                    lnumeric)
+            for row in reader:
+                for s in subsets:
+                    if row.get(s.column) == s.name:
+                        members.setdefault(row['ID'], []).append(s.stem)
+                        lrow = _na(row)
+                        for c in CURATED_COLUMNS:
+                            lrow[_curated(c, ORIGINAL_CURATOR)] = lrow.pop(c, NA)
+                            lrow[_curated(c, s.curator)] = ''
+                        writers[s.stem].writerow(lrow)
+                        counts[s.stem][0] += 1
+
+    if forms:
+        fpath, fnumeric = _table(cldf_dir, 'forms.csv')
+        with fpath.open(encoding='utf-8') as fp:
+            reader = csv.DictReader(fp)
+            columns = reader.fieldnames
+            with contextlib.ExitStack() as stack:
+                writers = {
+                    s.stem: _RWriter(
+                        stack.enter_context((out_dir / '{0}.forms.csv'.format(s.stem)).open(
+                            'w', encoding='utf-8', newline='')),
+                        columns,
+                        fnumeric)
+                    for s in subsets}
+                for row in reader:
+                    for stem in members.get(row['Language_ID'], ()):
+                        writers[stem].writerow(_na(row))
+                        counts[stem][1] += 1
+    return {k: tuple(v) for k, v in counts.items()}
@@ -0,0 +1,200 @@
+"""
+Reading and writing the curated `raw/xlsx/numerals-<lang_id>.xlsx` workbooks.
+
+Sheets are read straight into memory - with the same cell value conversion as
+`cldfbench.datadir.DataDir.xlsx2csv` - instead of round-tripping through temporary CSV files.
+
+Workbooks for curators are written in openpyxl's write-only mode, which streams rows to the
+file instead of building a cell object model, with the layout of the curated workbooks.
+"""
+import csv
+import json
+import hashlib
+import pathlib
+import multiprocessing
+
+from numerals_build.manifest import file_hash
+
+
+def excel_value(x):
+    if x is None:
+        return ""
+    if isinstance(x, float) and int(x) == x:
+        return '{0}'.format(int(x))
+    return '{0}'.format(x).strip()
+
+
+def read_workbook(path):
+    """
+    :return: `dict` mapping sheet names to lists of rows, each row a list of `str`, padded to the \
+    width of the sheet.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(str(path), read_only=True, data_only=True)
+    try:
+        res = {}
+        for sheet in wb.worksheets:
+            # Don't trust the dimension stored in the sheet - some tools write wrong ones:
+            sheet.reset_dimensions()
+            rows = [[excel_value(v) for v in row] for row in sheet.iter_rows(values_only=True)]
+            width = max((len(r) for r in rows), default=0)
+            res[sheet.title] = [r + [''] * (width - len(r)) for r in rows]
+        return res
+    finally:
+        wb.close()
+
+
+def sheet_dicts(rows):
+    """
+    Turn the rows of a sheet into dicts keyed by the values of the first row - like
+    `csv.DictReader` does for the converted sheet.
+    """
+    if not rows:
+        return []
+    header = rows[0]
+    return [dict(zip(header, row)) for row in rows[1:]]
+
+
+# Column widths and the rows of the Metadata sheet, as in the curated workbooks:
+DATA_WIDTHS = [16, 44, 60, 11, 54]
+METADATA_WIDTHS = [45, 175]
+METADATA_ROWS = [
+    ('glottocode', 'Glottocode'),
+    ('isocode', 'ISO639P3code'),
+    ('name', 'Name'),
+    ('name_zh', None),
+    ('sourcefile', 'SourceFile'),
+    ('base', 'Base'),
+    ('author_fam', None),
+    ('author_first', None),
+    ('author', 'Contributor'),
+    ('ref', None),
+    ('glotto_ref_id', None),
+    ('date', None),
+    ('countries', None),
+    ('other_location', None),
+    ('lg_comment', 'Comment'),
+]
+
+
+def _numeral(param):
+    return int(param) if param.isdigit() else param
+
+
+def write_workbook(path, language, forms):
+    """
+    Write a workbook with the Data and Metadata sheets for a language.
+
+    :param language: `dict` of the language's row in `etc/languages.csv`.
+    :param forms: Iterable of `dict`s of the rows of the language's data file.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+    from pynumerals.numerals_utils import XLSX_LABELS
+
+    wb = openpyxl.Workbook(write_only=True)
+    bold = Font(bold=True)
+
+    def sheet(title, widths):
+        ws = wb.create_sheet(title)
+        for i, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        return ws
+
+    def header(ws, values):
+        cells = []
+        for v in values:
+            cell = WriteOnlyCell(ws, value=v)
+            cell.font = bold
+            cells.append(cell)
+        return cells
+
+    data = sheet(XLSX_LABELS['data'], DATA_WIDTHS)
+    data.freeze_panes = 'A2'
+    data.append(header(data, [
+        XLSX_LABELS[k] for k in ['param', 'form', 'form_comment', 'loan', 'other_form']]))
+    for row in forms:
+        data.append([
+            _numeral(row['Parameter_ID']),
+            row['Form'],
+            row['Comment'] or None,
+            1 if row['Loan'] in ('True', 'true') else None,
+            row['Other_Form'] or None,
+        ])
+
+    metadata = sheet(XLSX_LABELS['metadata'], METADATA_WIDTHS)
+    for label, col in METADATA_ROWS:
+        metadata.append(
+            header(metadata, [XLSX_LABELS[label]]) + [(language.get(col) or None) if col else None])
+
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(path))
+    return path
+
+
+def export_workbook(job):
+    """
+    Write the workbook for a job `(path, language, data file)` - run by `convert_workbooks` in
+    worker processes.
+    """
+    path, language, data_file = job
+    with pathlib.Path(data_file).open(encoding='utf-8') as fp:
+        forms = [r for r in csv.DictReader(fp) if r['Language_ID'] == language['ID']]
+    return write_workbook(path, language, forms)
+
+
+def convert_workbooks(func, paths, workers=1):
+    """
+    Yield `func(path)` for each path in `paths`, in order, computed by a pool of `workers`
+    processes if `workers > 1`.
+    """
+    paths = list(paths)
+    if not workers or workers <= 1 or len(paths) < 2:
+        for path in paths:
+            yield func(path)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(func, paths, chunksize=max(1, len(paths) // (workers * 8)))
+
+
+def row_hash(row):
+    """
+    Hash of a language row - as converted from a workbook or as read from `etc/languages.csv`,
+    where `None` becomes the empty string.
+    """
+    row = {k: '' if v is None else str(v) for k, v in row.items()}
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ConversionLog:
+    """
+    Content hashes of each workbook, of the `etc/csv` file and of the `etc/languages.csv` row
+    generated from it, stored as JSON.
+
+    A workbook needs no conversion if all three hashes are unchanged since the last conversion.
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.hashes = {}
+        if self.path.exists():
+            self.hashes = json.loads(self.path.read_text(encoding='utf-8'))
+
+    def is_current(self, xlsx_file, csv_file, language):
+        record = self.hashes.get(pathlib.Path(xlsx_file).name)
+        return bool(record) \
+            and pathlib.Path(csv_file).exists() \
+            and record.get('language') == row_hash(language) \
+            and record['xlsx'] == file_hash(xlsx_file) \
+            and record['csv'] == file_hash(csv_file)
+
+    def add(self, xlsx_file, csv_file, language):
+        self.hashes[pathlib.Path(xlsx_file).name] = dict(
+            xlsx=file_hash(xlsx_file), csv=file_hash(csv_file), language=row_hash(language))
+
+    def write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.hashes, indent=1, sort_keys=True), encoding='utf-8')
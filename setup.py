@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import setup, find_packages
 import json
 
 
@@ -12,27 +12,36 @@ setup(
     license=metadata.get('license', ''),
     url=metadata.get('url', ''),
     py_modules=['lexibank_numerals'],
+    packages=find_packages(include=['numerals_build', 'numerals_build.*']),
     include_package_data=True,
     zip_safe=False,
     entry_points={
         'lexibank.dataset': [
             'numerals=lexibank_numerals:Dataset',
-        ]
+        ],
+        'cldfbench.commands': [
+            'numerals=numerals_build.commands',
+        ],
     },
     install_requires=[
         'cldfbench>=1.6.0',
-        'clldutils>=3.7.0'
+        'clldutils>=3.7.0',
         'cldfcatalog>=1.3.0',
-        'pycldf>=1.19.0'
+        'pycldf>=1.19.0',
         'pylexibank>=2.8.2',
         'pynumerals',
         'tqdm>=4.60.0',
         'pyglottolog>=3.4.2',
         'openpyxl>=3.0.5',
+        'numpy',
+        'requests',
     ],
     extras_require={
         'test': [
             'pytest-cldf',
         ],
+        'cognates': [
+            'rapidfuzz>=2.0',
+        ],
     },
 )
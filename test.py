@@ -1,7 +1,11 @@
+import pathlib
+
+import pytest
+
 from pycldf import Wordlist
 
 from lexibank_numerals import CHANURL
-from pynumerals.numerals_utils import split_form_table
+from pynumerals.numerals_utils import split_form_table, make_index_link
 
 channumerals = split_form_table(Wordlist.from_metadata("tests/cldf-metadata.json"))
 
@@ -58,3 +62,608 @@ class TestUtil:
 
         assert "" == make_language_name()
         assert " (Sindarin)" == make_language_name("Sindarin")
+
+    @staticmethod
+    def test_read_data_files():
+        from numerals_build.ingest import read_data_files
+
+        kw = dict(
+            ignored_lang_ids={"abai1240-1"},
+            valid_languages={"aari1239-1", "abad1241-1", "abau1245-1"},
+            valid_parameters={str(i) for i in range(1, 100)},
+            missing_data=["Ø"],
+        )
+        paths = [pathlib.Path("tests/forms.csv")] * 3
+        serial = list(read_data_files(paths, **kw))
+        assert serial == list(read_data_files(paths, workers=2, **kw))
+        assert serial[0].rows[0][:4] == ("aari1239-1", "1", "wólːáq", "wólːáq")
+        assert {r[0] for r in serial[0].rows} == kw["valid_languages"]
+        assert "zuoj1238-1" in serial[0].unknown_languages
+
+    @staticmethod
+    def test_build_manifest(tmp_path):
+        from numerals_build.manifest import BuildManifest
+
+        kw = dict(
+            ignored_lang_ids=set(),
+            valid_languages={"aari1239-1"},
+            valid_parameters={str(i) for i in range(1, 100)},
+            missing_data=["Ø"],
+        )
+        paths = [pathlib.Path("tests/forms.csv")]
+        manifest = BuildManifest(tmp_path)
+        first = list(manifest.read_data_files(paths, **kw))
+        manifest.save()
+        assert manifest.stats == dict(cached=0, parsed=1)
+
+        manifest = BuildManifest(tmp_path)
+        assert list(manifest.read_data_files(paths, **kw)) == first
+        assert manifest.stats == dict(cached=1, parsed=0)
+
+        kw["valid_languages"].add("zuoj1238-1")
+        manifest = BuildManifest(tmp_path)
+        assert list(manifest.read_data_files(paths, **kw)) != first
+        assert manifest.stats == dict(cached=0, parsed=1)
+
+    @staticmethod
+    def test_language_id_map(tmp_path):
+        from numerals_build.ids import LanguageIDMap
+
+        lgid_map = LanguageIDMap.from_languages([
+            dict(ID="guan1266-1", Glottocode="guan1266"),
+            dict(ID="guan1266-2", Glottocode="guan1266"),
+            dict(ID="guan1266-3", Glottocode="guan1266"),
+            dict(ID="xxxx0001-1", Glottocode=""),
+            dict(ID="abcd1234-1", Glottocode="guan1266"),
+        ], ignored={"guan1266-2"})
+        assert lgid_map.renumber("guan1266-3") == "guan1266-2"
+        assert lgid_map["abcd1234-1"] == "guan1266-3"
+        assert lgid_map["xxxx0001-1"] == "xxxx0001-1"
+        assert "guan1266-2" not in lgid_map
+        assert lgid_map.changed() == [("guan1266-3", "guan1266-2"), ("abcd1234-1", "guan1266-3")]
+
+        lgid_map.write(tmp_path / "ids.csv")
+        assert (tmp_path / "ids.csv").read_text().splitlines()[:2] == [
+            "Original_ID,ID", "guan1266-1,guan1266-1"]
+
+    @staticmethod
+    def test_split_writer(tmp_path):
+        from numerals_build.split import SplitWriter
+
+        with SplitWriter(tmp_path / "csv", tmp_path / "index.md", batch_size=2) as writer:
+            for entry in channumerals:
+                path = writer.write_csv(
+                    entry[0]["Language_ID"] + ".csv", entry[0].keys(), entry)
+                writer.add_index_line(make_index_link(str(path)))
+        assert len(list((tmp_path / "csv").glob("*.csv"))) == len(channumerals)
+        assert len((tmp_path / "index.md").read_text().splitlines()) == len(channumerals)
+
+    @staticmethod
+    def test_xlsx_conversion_log(tmp_path):
+        from numerals_build.xlsx import ConversionLog, convert_workbooks, sheet_dicts
+
+        assert list(convert_workbooks(str.upper, ["a", "b", "c"], workers=2)) == ["A", "B", "C"]
+        assert sheet_dicts([["Param", "Form"], ["1", "een"]]) == [{"Param": "1", "Form": "een"}]
+
+        xlsx, csv_ = tmp_path / "numerals-abcd1234-1.xlsx", tmp_path / "abcd1234-1.csv"
+        xlsx.write_bytes(b"xlsx")
+        csv_.write_text("ID")
+        language = {"ID": "abcd1234-1", "Name": "A", "Comment": None}
+        log = ConversionLog(tmp_path / "hashes.json")
+        assert not log.is_current(xlsx, csv_, language)
+        log.add(xlsx, csv_, language)
+        log.write()
+        # The row as read back from etc/languages.csv:
+        row = {"ID": "abcd1234-1", "Name": "A", "Comment": ""}
+        assert ConversionLog(tmp_path / "hashes.json").is_current(xlsx, csv_, row)
+        assert not ConversionLog(tmp_path / "hashes.json").is_current(
+            xlsx, csv_, dict(row, Name="B"))
+        csv_.write_text("ID,Form")
+        assert not ConversionLog(tmp_path / "hashes.json").is_current(xlsx, csv_, row)
+
+    @staticmethod
+    def test_read_workbook():
+        from numerals_build.xlsx import read_workbook
+
+        # The sheet claims the dimension A1:B2, but has 4 rows of 3 cells:
+        assert read_workbook("tests/wrong-dimension.xlsx") == {"Numerals": [
+            ["Parameter", "Form", "Comment"],
+            ["1", "een", ""],
+            ["2", "twee", "x"],
+            ["3", "drie", ""]]}
+
+    @staticmethod
+    def test_problem_detector():
+        from pynumerals.errorcheck import errorchecks
+        from numerals_build.problems import DETECTOR
+
+        forms = [f["Form"] for entry in channumerals for f in entry]
+        forms += ["(o̥/h)", "kõ(o̥", "ten-ABC", "see 2.", "IPA", "12'000", "or x", "ab\n-ABC"]
+        for form in forms:
+            assert DETECTOR.is_problematic(form) == any(check(form) for check in errorchecks)
+        assert DETECTOR.reasons("kõ(o̥") == ("has_parenthesis",)
+        assert DETECTOR.reasons("x (1", "<sp.") == (
+            "has_numeric", "has_parenthesis", "other_form_loanword")
+        assert DETECTOR.batch([("a", None), ("a. b", None), ("a", None)]) == [
+            (), ("has_blacklist_item", "has_abbr"), ()]
+
+    @staticmethod
+    def test_fingerprints(tmp_path):
+        from numerals_build.fingerprints import FingerprintIndex
+
+        index = FingerprintIndex()
+        for entry in channumerals:
+            for f in entry:
+                index.add_form(f["Language_ID"], f["Parameter_ID"], f["Form"])
+        for i, f in enumerate(channumerals[0]):
+            index.add_form("copy-1", f["Parameter_ID"], f["Form"])
+            index.add_form("copy-2", f["Parameter_ID"], f["Form"].upper())
+            index.add_form("copy-3", f["Parameter_ID"], f["Form"] if i else "xxx")
+        assert index.duplicates("raw") == [["aari1239-1", "copy-1"]]
+        assert index.duplicates("slug") == [["aari1239-1", "copy-1", "copy-2"]]
+        assert [(a, b) for a, b, _ in index.similar(0.8)] == [
+            ("aari1239-1", "copy-3"), ("copy-1", "copy-3"), ("copy-2", "copy-3")]
+
+        index.save(tmp_path / "fp.json")
+        assert FingerprintIndex.load(tmp_path / "fp.json").fingerprints == index.fingerprints
+
+    @staticmethod
+    def test_natural_key():
+        from numerals_build.ids import natural_key, FormBuckets
+
+        assert natural_key("abcd1234-2-10-1") == ("abcd1234", 2, 10, 1)
+        ids = [
+            "abcd1234-10-2-1", "abcd1234-2-10-1", "abcd1234-2-9-1", "abcd1234-2-9-2",
+            "aaaa1234-1-1-1"]
+        forms = FormBuckets()
+        for id_ in ids:
+            forms.add(dict(
+                ID=id_, Language_ID=id_.rsplit("-", 2)[0], Parameter_ID=id_.split("-")[2]))
+        assert len(forms) == len(ids)
+        assert [f["ID"] for f in forms] == sorted(ids, key=natural_key)
+
+    @staticmethod
+    def test_form_buckets_spill(tmp_path):
+        from numerals_build.ids import natural_key, FormBuckets
+
+        forms, ids = FormBuckets(spill_dir=tmp_path), []
+        for entry in reversed(channumerals):
+            for f in entry:
+                forms.add(f)
+                ids.append(f["ID"])
+            forms.flush()
+        forms.add(dict(ID="aari1239-1-1-2", Language_ID="aari1239-1", Parameter_ID="1"))
+        ids.append("aari1239-1-1-2")
+        assert [f["ID"] for f in forms] == sorted(ids, key=natural_key)
+        assert [f["ID"] for f in forms] == sorted(ids, key=natural_key)
+
+    @staticmethod
+    def test_benchmark(tmp_path):
+        from numerals_build import benchmark
+
+        res = benchmark.run(tmp_path, scale=0.002, memory=False)
+        assert res["languages"] == 11
+        assert list(res["stages"]) == benchmark.STAGES
+        old = benchmark.report([res])
+        assert len(benchmark.compare(old, old)) == len(benchmark.STAGES)
+
+    @staticmethod
+    def test_import_time():
+        from numerals_build import benchmark
+
+        res = benchmark.import_time(repeat=1)
+        assert res["seconds"] > 0
+        assert res["eager_modules"] == []
+
+    @staticmethod
+    def test_group_rows():
+        from numerals_build.split import group_rows
+
+        rows = [f for entry in channumerals for f in entry]
+        assert list(group_rows(rows)) == channumerals
+        # Interleaving within the window is tolerated:
+        rows = [dict(Language_ID=k) for k in "aabab"]
+        assert [len(g) for g in group_rows(rows, window=2)] == [3, 2]
+        with pytest.raises(ValueError):
+            list(group_rows(rows, window=1))
+
+    @staticmethod
+    def test_instrumentation(tmp_path):
+        import json
+        from numerals_build.instrument import Instrumentation
+
+        instr = Instrumentation(profile=tmp_path / "makecldf.prof")
+        with instr.run(tmp_path / "report.json"):
+            assert list(instr.iterate("row_parsing", range(3))) == [0, 1, 2]
+            for _ in range(2):
+                with instr.stage("writing", items=5):
+                    pass
+            assert instr.timed("sorting", sorted)([2, 1]) == [1, 2]
+            instr.language("abcd1234-1", 0.5, 10)
+            instr.language("abcd1234-2", 0.1, 20)
+            instr.count("forms", 30)
+        report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+        assert report["stages"]["row_parsing"]["items"] == 3
+        assert report["stages"]["writing"]["calls"] == 2
+        assert report["stages"]["writing"]["items"] == 10
+        assert report["counters"]["forms"] == 30
+        assert report["slowest_languages"][0]["ID"] == "abcd1234-1"
+        assert report["largest_languages"][0]["ID"] == "abcd1234-2"
+        assert (tmp_path / "makecldf.prof").exists()
+
+    @staticmethod
+    def test_diagnostics(tmp_path):
+        from numerals_build.diagnostics import Diagnostics
+
+        class Log(list):
+            def info(self, msg):
+                self.append(msg)
+
+            warn = info
+
+        log, diagnostics = Log(), Diagnostics()
+        diagnostics.add("unknown_parameter", language="abcd1234-1", parameter="100", row=3)
+        diagnostics.add("unknown_parameter", language="abcd1234-2", parameter="20", row=5)
+        diagnostics.add("unknown_parameter", language="abcd1234-2", parameter="2a", row=6)
+        diagnostics.add("unknown_parameter", language="abcd1234-2", parameter="", row=8)
+        diagnostics.add("form_length", file="etc/csv/abcd1234-1.csv", row=2)
+        diagnostics.add("form_length", file="etc/csv/abcd1234-1.csv", row=7)
+        diagnostics.add("identical_tables", log=log, value="abcd1234-1, abcd1234-2")
+        assert len(log) == 1
+        assert len(diagnostics.query(code="form_length")) == 2
+        assert [f.parameter for f in diagnostics.query(language="abcd1234-1")] == ["100"]
+        diagnostics.log(log)
+        assert log[1:] == [
+            "Parameter_ID 20 for abcd1234-2 unknown",
+            "Parameter_ID 100 for abcd1234-1 unknown",
+            "Parameter_ID  for abcd1234-2 unknown",
+            "Parameter_ID 2a for abcd1234-2 unknown",
+            "check Form in abcd1234-1.csv"]
+        with pytest.raises(ValueError):
+            diagnostics.add("unknown_check")
+
+        diagnostics.write_json(tmp_path / "diagnostics.json")
+        diagnostics.write_csv(tmp_path / "diagnostics.csv")
+        loaded = Diagnostics.from_json(tmp_path / "diagnostics.json")
+        assert loaded.findings == diagnostics.findings
+        assert loaded.counts() == diagnostics.counts()
+
+    @staticmethod
+    def test_form_row(tmp_path):
+        import attr
+        import pickle
+        from lexibank_numerals import CustomLexeme
+        from numerals_build.rows import FormRow, COLUMNS
+
+        assert COLUMNS == tuple(f.name for f in attr.fields(CustomLexeme))
+        d = dict(
+            ID="abcd1234-1-1-1", Language_ID="abcd1234-1", Parameter_ID="1", Value="a",
+            Form="a", Source=["chan2019"], Segments=[], Problematic=True)
+        row, other = FormRow.from_dict(d), FormRow.from_dict(dict(d, ID="abcd1234-1-1-2"))
+        assert row["Form"] == row.get("Form") == "a"
+        assert row.get("unknown", 1) == 1
+        assert other.Source is row.Source and other.Segments is row.Segments
+        row["Problematic"] = False
+        assert not row.Problematic
+        assert pickle.loads(pickle.dumps(row)) == row
+        assert dict(row)["Language_ID"] == "abcd1234-1"
+
+        ds = Wordlist.in_dir(tmp_path)
+        ds.add_component("LanguageTable")
+        ds.add_component("ParameterTable")
+        ds.write(
+            FormTable=[row],
+            LanguageTable=[dict(ID="abcd1234-1")],
+            ParameterTable=[dict(ID="1")])
+        forms = list(ds["FormTable"])
+        assert forms[0]["ID"] == "abcd1234-1-1-1" and forms[0]["Source"] == ["chan2019"]
+
+    @staticmethod
+    def test_glottolog_index(tmp_path):
+        from numerals_build.glottolog import GlottologIndex, IndexedLanguoid, version_key
+
+        index = GlottologIndex.build(tmp_path / "glottolog.sqlite", [
+            IndexedLanguoid(
+                "stan1295", "German", "language", iso="deu", latitude=48.65, longitude=12.47,
+                family_id="indo1319", family="Indo-European", macroareas=["Eurasia"]),
+            IndexedLanguoid("indo1319", "Indo-European", "family", category="Family"),
+        ], version="v4.8")
+        index = GlottologIndex(index.path)
+        assert index.version == "v4.8"
+        assert len(index) == 2 and list(index) == ["indo1319", "stan1295"]
+        assert "stan1295" in index.cached_languoids and "abcd1234" not in index
+        lang = index.api.cached_languoids["stan1295"]
+        assert lang.lineage[0][0] == "Indo-European"
+        assert lang.macroareas[0].name == "Eurasia"
+        assert index.glottocode_by_iso == {"deu": "stan1295"}
+        assert [lg.category for lg in index.languoids()] == ["Family", None]
+        assert index.json_ld()["rdf:about"] == "https://github.com/glottolog/glottolog"
+        assert index.json_ld()["dc:created"] == "v4.8"
+
+        assert version_key("v4.8") < version_key("v4.8-2-gabcdef0") < version_key("v4.10")
+        assert version_key("abcdef0") is None
+
+    @staticmethod
+    def test_subsets(tmp_path):
+        import csv
+        import shutil
+        from numerals_build.subsets import Subset, export
+
+        cldf = tmp_path / "cldf"
+        shutil.copytree("tests", str(cldf))
+        with (cldf / "languages.csv").open(encoding="utf-8") as fp:
+            langs = list(csv.DictReader(fp))
+        langs[0].update(
+            ID="aari1239-1", Family="Atlantic-Congo", Latitude="4.8300", Base="decimal")
+        with (cldf / "languages.csv").open("w", encoding="utf-8", newline="") as fp:
+            writer = csv.DictWriter(fp, list(langs[0]))
+            writer.writeheader()
+            writer.writerows(langs)
+
+        counts = export(cldf, tmp_path / "families", [
+            Subset.from_spec("Family", "Atlantic-Congo:Enock"), Subset("Family", "Dravidian")])
+        assert counts["atlanticcongo"][0] == 1 and counts["atlanticcongo"][1] > 0
+        assert counts["dravidian"] == (0, 0)
+        lines = (tmp_path / "families" / "atlanticcongo.languages.csv").read_text(
+            encoding="utf-8").split("\n")
+        assert lines[0].endswith('"Base.Chan","Base.Enock","Comment.Chan","Comment.Enock"')
+        assert lines[1].startswith('"1","aari1239-1",')
+        assert ',4.83,NA,"Atlantic-Congo",' in lines[1] and '"decimal","",' in lines[1]
+        with (tmp_path / "families" / "atlanticcongo.forms.csv").open(encoding="utf-8") as fp:
+            assert {r["Language_ID"] for r in csv.DictReader(fp)} == {"aari1239-1"}
+
+    @staticmethod
+    def test_cognates(tmp_path):
+        import csv
+        from numerals_build import cognates
+        from numerals_build.cognates import Form
+
+        forms = [
+            Form("a-1-1", "a-1", "1", "hana"),
+            Form("b-1-1", "b-1", "1", "Hana"),
+            Form("c-1-1", "c-1", "1", "hane"),
+            Form("d-1-1", "d-1", "1", "hana"),
+            Form("e-1-1", "e-1", "1", "ikko"),
+            Form("f-1-1", "f-1", "1", "ikkot"),
+        ]
+        blocks = {"a-1": "x", "b-1": "x", "c-1": "x", "d-1": "y", "e-1": "x", "f-1": "x"}
+        sets = cognates.cognate_sets(forms, blocks, threshold=0.25, chunk=2)
+        assert [[f.id for f in s] for s in sets] == [
+            ["a-1-1", "b-1-1", "c-1-1"], ["e-1-1", "f-1-1"]]
+
+        n = cognates.write(tmp_path / "cognates.csv", cognates.rows({"1": forms}, blocks))
+        assert n == 5
+        with (tmp_path / "cognates.csv").open(encoding="utf-8") as fp:
+            rows = list(csv.DictReader(fp))
+        assert list(rows[0]) == cognates.COLUMNS
+        assert rows[0]["Cognateset_ID"] == "1-1" and rows[-1]["Cognateset_ID"] == "1-2"
+
+    @staticmethod
+    def test_coverage(tmp_path):
+        from numerals_build.coverage import CoverageMatrix
+
+        matrix = CoverageMatrix(["a-1", "b-1"], ["1", "2", "3"])
+        matrix.add("a-1", "1")
+        matrix.add("a-1", "1", loan=True)
+        matrix.add("a-1", "2", overwrite=True)
+        matrix.add("b-1", "1", problematic=True)
+        matrix.save(tmp_path / "coverage.npz")
+        old = CoverageMatrix.load(tmp_path / "coverage.npz")
+        assert old.count("a-1", "1") == 2
+        assert old.coverage() == {"a-1": 2, "b-1": 1}
+        assert old.gaps(["1", "2"]) == {"b-1": ["2"]}
+        assert old.synonymy()["1"] == (2, 1, 1.5)
+        assert old.flagged("loan") == {"a-1": ["1"]}
+        assert old.flagged("overwrite") == {"a-1": ["2"]}
+        stats = old.statistics()
+        assert (stats["varieties"], stats["concepts"], stats["lexemes"]) == (2, 2, 4)
+        assert stats["synonymy"] == 1.25
+
+        new = CoverageMatrix(["a-1", "c-1"], ["1", "2", "3"])
+        new.add("a-1", "3")
+        assert new.finish().changes(old) == [
+            ("a-1", ["3"], ["1", "2"]), ("b-1", None, None), ("c-1", None, None)]
+
+    @staticmethod
+    def test_diff(tmp_path):
+        import subprocess
+        from numerals_build.diff import Tree, Snapshot, diff, blob_hash
+
+        def build(d, forms, languages, overwrites=()):
+            (d / "cldf").mkdir(parents=True)
+            (d / "etc" / "csv").mkdir(parents=True)
+            (d / "cldf" / "languages.csv").write_text(
+                "ID,Name\n" + "".join("{0},{1}\n".format(*lg) for lg in languages))
+            (d / "cldf" / "forms.csv").write_text(
+                "ID,Language_ID,Form\n" + "".join("{0},{1},{2}\n".format(*f) for f in forms))
+            for name in overwrites:
+                (d / "etc" / "csv" / name).write_text(str(d))
+            return Tree(d)
+
+        old = build(
+            tmp_path / "old",
+            [("a-1-1-1", "a-1", "x"), ("a-1-2-1", "a-1", "y"), ("b-1-1-1", "b-1", "z")],
+            [("a-1", "A"), ("b-1", "B")],
+            ["a-1.csv"])
+        new = build(
+            tmp_path / "new",
+            [("b-1-1-1", "b-1", "z"), ("a-1-1-1", "a-1", "x"), ("a-1-2-1", "a-1", "yy"),
+             ("a-1-3-1", "a-1", "w"), ("c-1-1-1", "c-1", "v")],
+            [("a-1", "A"), ("b-1", "B"), ("c-1", "C")],
+            ["a-1.csv"])
+        assert blob_hash(new.repos / "cldf" / "forms.csv") == subprocess.check_output(
+            ["git", "hash-object", str(new.repos / "cldf" / "forms.csv")]).decode().strip()
+
+        report = diff(old, new, cache_dir=tmp_path / "digests")
+        assert report["summary"] == {
+            "forms_added": 2, "forms_modified": 1, "forms_removed": 0,
+            "languages_added": 1, "languages_changed": 1}
+        a, c = report["languages"]
+        assert a["ID"] == "a-1" and a["forms_added"] == ["a-1-3-1"]
+        assert a["forms_modified"] == {"a-1-2-1": {"Form": ["y", "yy"]}}
+        assert a["overwrite"] == "etc/csv/a-1.csv" and a["overwrite_changed"]
+        assert c["status"] == "added" and c["overwrite"] is None
+        assert len(list((tmp_path / "digests").glob("*.json"))) == 2
+        assert Snapshot.from_tree(new, tmp_path / "digests").languages["b-1"][2] == 1
+
+    @staticmethod
+    def test_diff_crlf(tmp_path):
+        import subprocess
+        from numerals_build.diff import Tree, blob_hash
+
+        def git(*args):
+            return subprocess.check_output(
+                ["git", "-c", "user.name=x", "-c", "user.email=x@example.org"] + list(args),
+                cwd=str(tmp_path))
+
+        git("init", "-q")
+        (tmp_path / ".gitattributes").write_text("*.csv text eol=crlf\n")
+        (tmp_path / "etc" / "csv").mkdir(parents=True)
+        (tmp_path / "etc" / "csv" / "a-1.csv").write_bytes(b"ID,Form\r\n1,a\rb\r\n")
+        git("add", ".")
+        git("commit", "-q", "-m", "init")
+        # The working tree file has CRLF line endings, the blob LF:
+        assert b"\r\n" in (tmp_path / "etc" / "csv" / "a-1.csv").read_bytes()
+        assert blob_hash(tmp_path / "etc" / "csv" / "a-1.csv") == git(
+            "rev-parse", "HEAD:etc/csv/a-1.csv").decode().strip()
+        assert Tree(tmp_path).blobs("etc/csv") == Tree(tmp_path, rev="HEAD").blobs("etc/csv")
+
+    @staticmethod
+    def test_export_workbook(tmp_path):
+        import csv
+        import pathlib
+        from numerals_build.xlsx import export_workbook
+        from lexibank_numerals import convert_workbook
+
+        data_file = pathlib.Path("etc/csv/abar1238-1.csv")
+        with data_file.open(encoding="utf-8") as fp:
+            reader = csv.DictReader(fp)
+            header, forms = reader.fieldnames, list(reader)
+        with open("etc/languages.csv", encoding="utf-8") as fp:
+            reader = csv.DictReader(fp)
+            lang_header = reader.fieldnames
+            language = [r for r in reader if r["ID"] == "abar1238-1"][0]
+
+        path = export_workbook((tmp_path / "numerals-abar1238-1.xlsx", language, data_file))
+        rows, lg = convert_workbook(path, header, lang_header, ["Ø"])
+        assert [
+            dict(zip(header, ["" if v is None else str(v) for v in r])) for r in rows] == forms
+        for col in ["Name", "Glottocode", "ISO639P3code", "SourceFile", "Base", "Comment"]:
+            assert lg[col] == language[col]
+
+    @staticmethod
+    def test_strings():
+        import unicodedata
+        from numerals_build import strings
+
+        strings.clear()
+        decomposed = unicodedata.normalize("NFD", "tɕʰí")
+        a, b = strings.nfc(decomposed), strings.nfc("".join(list(decomposed)))
+        assert a == unicodedata.normalize("NFC", decomposed) and a is b
+        assert strings.slug("Ná-ne") == "nane"
+        stats = strings.statistics()
+        assert stats["nfc"]["hits"] == 1 and stats["nfc"]["misses"] == 1
+        assert stats["nfc"]["hit_rate"] == 0.5 and stats["slug"]["size"] == 1
+
+    @staticmethod
+    def test_data_file_index(tmp_path):
+        from numerals_build.datafiles import DataFileIndex
+
+        etc, raw = tmp_path / "etc", tmp_path / "raw"
+        for d, names in [(etc, ["a-1", "x-1"]), (raw, ["a-1", "b-1", "a-10", "a-2"])]:
+            d.mkdir()
+            for name in names:
+                d.joinpath(name + ".csv").write_text("ID\n", encoding="utf-8")
+        index = DataFileIndex(etc, raw)
+        assert list(index.raw) == ["a-1", "a-2", "a-10", "b-1"]
+        assert index.resolve("a-1").overwrite and index.resolve("a-1").path == etc / "a-1.csv"
+        assert not index.resolve("b-1").overwrite and index.resolve("c-1") is None
+        assert index.stat(raw / "b-1.csv") == (index.raw["b-1"].mtime_ns, 3)
+        files, missing = index.orphans(["a-1", "a-2", "b-1", "c-1"])
+        assert [f.path.relative_to(tmp_path).as_posix() for f in files] == \
+            ["etc/x-1.csv", "raw/a-10.csv"]
+        assert missing == ["c-1"]
+        assert DataFileIndex(tmp_path / "nope", raw).overwrites == {}
+
+    @staticmethod
+    def test_fetch(tmp_path):
+        import zipfile
+        import threading
+        import functools
+        from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+        from numerals_build.fetch import fetch, FETCHED, UNCHANGED
+
+        mirror, raw = tmp_path / "mirror" / "cldf", tmp_path / "raw"
+        mirror.mkdir(parents=True)
+        raw.mkdir()
+        names = ["forms.csv", "languages.csv"]
+        for name in names:
+            mirror.joinpath(name).write_text(name, encoding="utf-8")
+        state = tmp_path / "state.json"
+
+        assert set(fetch(mirror, names, raw, state).values()) == {FETCHED}
+        assert set(fetch(mirror, names, raw, state, workers=1).values()) == {UNCHANGED}
+        assert raw.joinpath("forms.csv").read_text(encoding="utf-8") == "forms.csv"
+
+        archive = tmp_path / "release.zip"
+        with zipfile.ZipFile(str(archive), "w") as zf:
+            zf.writestr("release/forms.csv", "other")
+            zf.writestr("release/cldf/forms.csv", "new forms")
+            zf.writestr("release/cldf/languages.csv", "languages.csv")
+        res = fetch(archive, names, raw, state)
+        assert res == {"forms.csv": FETCHED, "languages.csv": UNCHANGED}
+        assert raw.joinpath("forms.csv").read_text(encoding="utf-8") == "new forms"
+
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=str(mirror))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = "http://127.0.0.1:{0}".format(server.server_address[1])
+            assert set(fetch(url, names, raw, state).values()) == {FETCHED}
+            assert set(fetch(url, names, raw, state).values()) == {UNCHANGED}
+            raw.joinpath("forms.csv").write_text("edited", encoding="utf-8")
+            assert fetch(url, names, raw, state)["forms.csv"] == FETCHED
+            assert raw.joinpath("forms.csv").read_text(encoding="utf-8") == "forms.csv"
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def test_search(tmp_path):
+        from numerals_build.diff import Tree
+        from numerals_build.search import SearchIndex, levenshtein
+
+        def build(forms):
+            (tmp_path / "cldf").mkdir(exist_ok=True)
+            (tmp_path / "cldf" / "languages.csv").write_text(
+                "ID,Family\na-1,Indo-European\nb-1,Austronesian\n", encoding="utf-8")
+            (tmp_path / "cldf" / "forms.csv").write_text(
+                "ID,Language_ID,Parameter_ID,Value,Form,Comment,Other_Form\n" +
+                "".join("{0}-{1}-1,{0},{1},{2},{2},{3},\n".format(*f) for f in forms),
+                encoding="utf-8")
+            return Tree(tmp_path)
+
+        assert levenshtein("satus", "sato") == 2 and levenshtein("satus", "sato", 1) is None
+        index = SearchIndex(tmp_path / "search.sqlite")
+        forms = [
+            ("a-1", "100", "sto", ""), ("a-1", "4", "kõ(o̥/h)mĩ", "(< 'hundred')"),
+            ("b-1", "100", "Sátus", ""), ("b-1", "2", "dua", "")]
+        assert index.update(build(forms)) == (["a-1", "b-1"], [], [])
+        assert index.update(build(forms)) == ([], [], [])
+        assert [(h.form_id, h.field) for h in index.search("(o̥/h)")] == [("a-1-4-1", "Form")]
+        assert [h.field for h in index.search("hundred")] == ["Comment"]
+        assert [h.form_id for h in index.search("t")] == ["a-1-100-1", "b-1-100-1"]
+        assert [h.form_id for h in index.search("satus")] == []
+        assert [h.form_id for h in index.search("satus", normalize=True)] == ["b-1-100-1"]
+        assert [(h.form_id, h.distance) for h in index.search("Sátu", fuzzy=1)] == \
+            [("b-1-100-1", 1)]
+        assert [h.form_id for h in index.search("s", families=["Austronesian"])] == \
+            ["b-1-100-1"]
+        assert [h.form_id for h in index.search("u", parameters=["2"])] == ["b-1-2-1"]
+
+        forms[2] = ("b-1", "100", "ratus", "")
+        assert index.update(build(forms[2:])) == ([], [], ["a-1", "b-1"])
+        assert [h.form_id for h in index.search("atus")] == ["b-1-100-1"]
+        assert index.search("hundred") == [] and index.search("sátus") == []
+        assert len(index) == 2
+        index.close()